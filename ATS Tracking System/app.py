@@ -1,54 +1,551 @@
 import os
-import io
-import base64
+import time
+import subprocess
 from dotenv import load_dotenv
-import streamlit as st
-from PIL import Image
-import pdf2image
-import google.generativeai as genai
+from render import render_pages
+from payload import DEFAULT_TARGET_BYTES, QUALITY_STEPS, image_parts, pack_parts, payload_size, unpack_parts
+from client import get_client
+from jobs import get_job_queue, key_lock
+from prompts import DISTILL_PROMPT, PROMPTS, analysis_name
+from tracing import span, start_metrics_server
+from cache import content_key, get_profile_store, get_render_cache, get_response_cache, response_key
 
 # Load environment variables
 load_dotenv()
 
-# Configure Google Generative AI
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Settings that affect the rasterized output; part of the render cache key
+RENDER_SETTINGS = {
+    "format": "JPEG",
+    "first_page": 1,
+    "last_page": int(os.getenv("ATS_RENDER_MAX_PAGES", "2")),
+    "profile": os.getenv("ATS_RENDER_PROFILE", "default"),
+    "max_pixels": int(os.getenv("ATS_RENDER_MAX_PIXELS", "8000000")),
+    # JPEG encoding settings, so changing them invalidates cached payloads
+    "jpeg_target_bytes": DEFAULT_TARGET_BYTES,
+    "quality_steps": QUALITY_STEPS,
+}
+
+# Text-layer ingestion: pages with fewer characters than this are rasterized instead
+TEXT_SETTINGS = {
+    "mode": "text",
+    "min_chars": 20,
+    "format": "JPEG",
+    "profile": RENDER_SETTINGS["profile"],
+    # Scanned pages are rasterized under the same page and pixel limits as image mode
+    "max_image_pages": RENDER_SETTINGS["last_page"] - RENDER_SETTINGS["first_page"] + 1,
+    "max_pixels": RENDER_SETTINGS["max_pixels"],
+    "jpeg_target_bytes": RENDER_SETTINGS["jpeg_target_bytes"],
+    "quality_steps": RENDER_SETTINGS["quality_steps"],
+}
+
+# Sidebar labels for the resume ingestion modes
+INGEST_MODES = {
+    "Text layer (image fallback for scanned pages)": "text",
+    "Page image": "image",
+    "Distilled profile (extracted once per resume)": "profile",
+}
+
+# Output budget for the one-time resume distillation
+PROFILE_MAX_TOKENS = int(os.getenv("ATS_PROFILE_MAX_TOKENS", "768"))
+
+# Analyses answered by the local scorer before (or instead of) the model
+LOCAL_SCORED = ("Percentage Match", "Keywords Missing")
+
+# Analyses about the page's appearance (layout, fonts, design); they always get the page images
+VISUAL_ANALYSES = ("Resume Formatting Suggestions",)
 
 def get_gemini_response(input_text, pdf_content, prompt):
     """
     Generate content using the Gemini AI model.
+    Identical (job description, resume, prompt, model) requests are served from the response cache.
     """
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    response = model.generate_content([input_text, pdf_content[0], prompt])
-    return response.text
+    with span("model_call", analysis=analysis_name(prompt)) as stage:
+        client = get_client()
+        response_cache = get_response_cache()
+        key = response_key(client.model_name, input_text, pdf_content, prompt)
+        if response_cache is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                stage.set(cache_hit=True)
+                return cached
+
+        response = client.generate_with_prefix([input_text, *pdf_content], [prompt])
+        stage.set(cache_hit=False, response_chars=len(response))
+        # An empty reply is a failed call, not an answer worth replaying
+        if response_cache is not None and response:
+            response_cache.put(key, response)
+        return response
+
+def stream_gemini_response(input_text, pdf_content, prompt, timings=None):
+    """
+    Stream content from the Gemini AI model, yielding text chunks as they arrive.
+    If a dict is passed as `timings`, time-to-first-token and total duration (seconds) are recorded in it.
+    """
+    with span("model_stream", analysis=analysis_name(prompt)) as stage:
+        start = time.perf_counter()
+        client = get_client()
+        response_cache = get_response_cache()
+        key = response_key(client.model_name, input_text, pdf_content, prompt)
+        if response_cache is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                stage.set(cache_hit=True)
+                if timings is not None:
+                    timings["first_token"] = timings["total"] = time.perf_counter() - start
+                    timings["cached"] = True
+                yield cached
+                return
+
+        chunks = []
+        for chunk in client.stream_with_prefix([input_text, *pdf_content], [prompt]):
+            if not chunks:
+                stage.set(first_token_ms=round((time.perf_counter() - start) * 1000, 2))
+                if timings is not None:
+                    timings["first_token"] = time.perf_counter() - start
+            chunks.append(chunk)
+            yield chunk
+        stage.set(cache_hit=False, chunks=len(chunks))
+        if timings is not None:
+            timings["total"] = time.perf_counter() - start
+            # An empty stream has no first chunk; its first (and only) event is the end
+            timings.setdefault("first_token", timings["total"])
+            timings["cached"] = False
+        text = "".join(chunks)
+        if response_cache is not None and text:
+            response_cache.put(key, text)
+
+def structured_gemini_response(input_text, pdf_content, analysis):
+    """
+    Run an analysis in structured mode and return the validated JSON as a dict.
+    Raises structured.StructuredOutputError if the reply does not match the analysis schema.
+    """
+    from structured import generation_config, parse_response, structured_prompt
+
+    prompt = structured_prompt(analysis, PROMPTS[analysis])
+    with span("model_call", analysis=analysis, structured=True) as stage:
+        client = get_client()
+        response_cache = get_response_cache()
+        key = response_key(client.model_name, input_text, pdf_content, prompt)
+        if response_cache is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                stage.set(cache_hit=True)
+                return parse_response(analysis, cached)
+
+        response = client.generate_with_prefix([input_text, *pdf_content], [prompt], generation_config(analysis))
+        stage.set(cache_hit=False, response_chars=len(response))
+        result = parse_response(analysis, response)
+        # Only replies that passed validation are cached
+        if response_cache is not None:
+            response_cache.put(key, response)
+        return result
+
+def read_upload(uploaded_file):
+    """
+    Return the full contents of an uploaded file, regardless of its read position.
+    In-memory uploads are returned as a zero-copy memoryview.
+    """
+    if hasattr(uploaded_file, "getbuffer"):
+        return uploaded_file.getbuffer()
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    return uploaded_file.read()
 
-def input_pdf_setup(uploaded_file):
+def input_pdf_setup(uploaded_file, first_page=None, last_page=None, profile=None, max_pixels=None):
     """
-    Convert the uploaded PDF to images and then to base64-encoded JPEG format.
+    Convert the uploaded PDF to images and then to size-bounded JPEG parts (raw bytes), one part per page.
+    Page range, render profile and pixel budget default to RENDER_SETTINGS.
+    Results are cached by the SHA-256 of the PDF bytes and the render settings.
     """
     if uploaded_file is not None:
-        # Convert the PDF to image
-        images = pdf2image.convert_from_bytes(uploaded_file.read())
-        first_page = images[0]
-
-        # Convert to bytes
-        img_byte_arr = io.BytesIO()
-        first_page.save(img_byte_arr, format='JPEG')
-        img_byte_arr = img_byte_arr.getvalue()
-
-        # Encode to base64
-        pdf_parts = [{
-            "mime_type": "image/jpeg",
-            "data": base64.b64encode(img_byte_arr).decode()
-        }]
-        return pdf_parts
+        settings = dict(RENDER_SETTINGS)
+        for name, value in (("first_page", first_page), ("last_page", last_page),
+                            ("profile", profile), ("max_pixels", max_pixels)):
+            if value is not None:
+                settings[name] = value
+
+        with span("input_pdf_setup") as stage:
+            with span("read") as read_stage:
+                pdf_bytes = read_upload(uploaded_file)
+                read_stage.set(bytes=len(pdf_bytes))
+            render_cache = get_render_cache()
+            key = content_key(pdf_bytes, settings)
+            cached = render_cache.get(key)
+            if cached is not None:
+                stage.set(cache_hit=True)
+                return unpack_parts(cached)
+
+            # Convert the selected pages to images
+            with span("rasterize") as rasterize_stage:
+                images = render_pages(
+                    pdf_bytes,
+                    first_page=settings["first_page"],
+                    last_page=settings["last_page"],
+                    profile=settings["profile"],
+                    max_pixels=settings["max_pixels"],
+                )
+                rasterize_stage.set(pages=len(images))
+            with span("encode") as encode_stage:
+                pdf_parts = image_parts(images)
+                encode_stage.set(bytes=payload_size(pdf_parts))
+            del images
+            stage.set(cache_hit=False)
+            render_cache.put(key, pack_parts(pdf_parts))
+            return pdf_parts
     else:
         raise FileNotFoundError("No file uploaded")
 
+def extract_page_texts(pdf_bytes):
+    """
+    Extract the text layer of every page with poppler's pdftotext in reading order
+    (no -layout: that keeps physical lines, which interleaves the columns of two-column resumes).
+    """
+    result = subprocess.run(
+        ["pdftotext", "-enc", "UTF-8", "-", "-"],
+        input=pdf_bytes, capture_output=True, check=True
+    )
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    # pdftotext terminates every page with a form feed, leaving an empty trailing entry
+    if pages and not pages[-1].strip():
+        pages.pop()
+    return pages
+
+def input_pdf_text_setup(uploaded_file):
+    """
+    Extract the resume's text layer page by page. Pages without extractable text
+    (e.g. scanned pages) fall back to a rasterized JPEG; at most
+    TEXT_SETTINGS["max_image_pages"] are rasterized, sharing the max_pixels budget.
+    """
+    if uploaded_file is not None:
+        with span("input_pdf_text_setup") as stage:
+            with span("read") as read_stage:
+                pdf_bytes = read_upload(uploaded_file)
+                read_stage.set(bytes=len(pdf_bytes))
+            render_cache = get_render_cache()
+            key = content_key(pdf_bytes, TEXT_SETTINGS)
+            cached = render_cache.get(key)
+            if cached is not None:
+                stage.set(cache_hit=True)
+                return unpack_parts(cached)
+
+            with span("extract_text"):
+                page_texts = extract_page_texts(pdf_bytes)
+            scanned = [page_number for page_number, text in enumerate(page_texts, start=1)
+                       if len(text.strip()) < TEXT_SETTINGS["min_chars"]]
+            rasterized = set(scanned[:TEXT_SETTINGS["max_image_pages"]])
+            page_pixels = TEXT_SETTINGS["max_pixels"] // max(len(rasterized), 1)
+            pdf_parts = []
+            for page_number, text in enumerate(page_texts, start=1):
+                if page_number not in scanned:
+                    pdf_parts.append("--- Resume page %d ---\n%s" % (page_number, text.strip()))
+                elif page_number in rasterized:
+                    with span("rasterize", page=page_number):
+                        images = render_pages(
+                            pdf_bytes,
+                            first_page=page_number,
+                            last_page=page_number,
+                            profile=TEXT_SETTINGS["profile"],
+                            max_pixels=page_pixels,
+                        )
+                    with span("encode", page=page_number):
+                        pdf_parts.extend(image_parts(images))
+            if not pdf_parts:
+                raise ValueError("The uploaded PDF has no pages")
+            stage.set(cache_hit=False, bytes=payload_size(pdf_parts), pages=len(page_texts),
+                      skipped_images=len(scanned) - len(rasterized))
+            render_cache.put(key, pack_parts(pdf_parts))
+            return pdf_parts
+    else:
+        raise FileNotFoundError("No file uploaded")
+
+def profile_key(pdf_bytes):
+    """
+    Store key of a resume's profile: the PDF hash plus the model and distillation prompt.
+    """
+    return content_key(pdf_bytes, {"mode": "profile", "model": get_client().model_name, "prompt": DISTILL_PROMPT})
+
+def profile_parts(profile):
+    """
+    Wrap a distilled profile as the content parts sent in place of the resume.
+    """
+    return ["--- Candidate profile (distilled from the resume) ---\n%s" % profile]
+
+def cached_profile(pdf_bytes):
+    """
+    Return the stored profile of this resume, or None if it has not been distilled yet.
+    """
+    return get_profile_store().get(profile_key(pdf_bytes))
+
+def distill_profile(pdf_bytes, pdf_parts):
+    """
+    Distill prepared resume parts into a profile and store it. Concurrent callers for the
+    same resume share one model call.
+    """
+    key = profile_key(pdf_bytes)
+    store = get_profile_store()
+    with key_lock(key):
+        profile = store.get(key)
+        if profile is None:
+            with span("distill"):
+                profile = get_client().generate(
+                    [*pdf_parts, DISTILL_PROMPT], config={"max_output_tokens": PROFILE_MAX_TOKENS}
+                ).strip()
+            if not profile:
+                raise ValueError("The resume profile came back empty")
+            store.put(key, profile)
+    return profile
+
+def input_pdf_profile_setup(uploaded_file):
+    """
+    Distill the resume once into a compact text profile (skills, education, experience, projects)
+    and return it as the only content part. Profiles are stored by the SHA-256 of the PDF, so later
+    analyses of the same resume send a few hundred tokens of text instead of the pages.
+    """
+    if uploaded_file is not None:
+        with span("input_pdf_profile_setup") as stage:
+            pdf_bytes = read_upload(uploaded_file)
+            profile = cached_profile(pdf_bytes)
+            stage.set(cache_hit=profile is not None)
+            if profile is None:
+                profile = distill_profile(pdf_bytes, input_pdf_text_setup(uploaded_file))
+            stage.set(profile_chars=len(profile))
+            return profile_parts(profile)
+    else:
+        raise FileNotFoundError("No file uploaded")
+
+def ingest_mode_for(analysis, mode):
+    """
+    Return the ingestion mode for one analysis: visual analyses always see the page images.
+    """
+    return "image" if analysis in VISUAL_ANALYSES else mode
+
+def ingest_groups(analysis_options, mode):
+    """
+    Group analyses by the ingestion mode they need, so the resume is prepared once per mode.
+    Returns {mode: [analysis, ...]} in the order the modes are first needed.
+    """
+    groups = {}
+    for option in analysis_options:
+        groups.setdefault(ingest_mode_for(option, mode), []).append(option)
+    return groups
+
+def prepare_resume(uploaded_file, mode=None):
+    """
+    Turn an uploaded resume into content parts using the given ingestion mode ("text", "image" or "profile").
+    """
+    mode = mode or os.getenv("ATS_INGEST_MODE", "text")
+    if mode == "image":
+        return input_pdf_setup(uploaded_file)
+    if mode == "profile":
+        return input_pdf_profile_setup(uploaded_file)
+    return input_pdf_text_setup(uploaded_file)
+
+def analysis_job(job, input_text, pdf_parts, prompt):
+    """
+    Background job body: stream one analysis into the job's chunks so the page can show partial output.
+    """
+    for chunk in stream_gemini_response(input_text, pdf_parts, prompt, job.timings):
+        job.chunks.append(chunk)
+    return "".join(job.chunks)
+
+def structured_job(job, input_text, pdf_parts, analysis):
+    """
+    Background job body for structured mode: the result is the validated JSON dict.
+    """
+    return structured_gemini_response(input_text, pdf_parts, analysis)
+
+def submit_analyses(input_text, pdf_parts, analysis_options, structured=False):
+    """
+    Queue one background job per analysis. Identical in-flight requests share a job.
+    With `structured`, analyses that have a JSON schema run in structured mode.
+    Returns (analysis, job_id) pairs.
+    """
+    from structured import SCHEMAS, structured_prompt
+
+    queue = get_job_queue()
+    model_name = get_client().model_name
+    submitted = []
+    for option in analysis_options:
+        if structured and option in SCHEMAS:
+            key = response_key(model_name, input_text, pdf_parts, structured_prompt(option, PROMPTS[option]))
+            submitted.append((option, queue.submit(key, structured_job, input_text, pdf_parts, option)))
+            continue
+        key = response_key(model_name, input_text, pdf_parts, PROMPTS[option])
+        submitted.append((option, queue.submit(key, analysis_job, input_text, pdf_parts, PROMPTS[option])))
+    return submitted
+
+def remote_analysis_job(job, api_url, input_text, pdf_bytes, prompt_name, ingest_mode):
+    """
+    Background job body in thin-client mode: stream one analysis from the analysis service (server.py).
+    """
+    from server import analyze_remote
+
+    start = time.perf_counter()
+    for chunk in analyze_remote(api_url, input_text, pdf_bytes, prompt_name, ingest_mode):
+        if not job.chunks:
+            job.timings["first_token"] = time.perf_counter() - start
+        job.chunks.append(chunk)
+    job.timings.update(total=time.perf_counter() - start, cached=False)
+    job.timings.setdefault("first_token", job.timings["total"])
+    return "".join(job.chunks)
+
+def remote_structured_job(job, api_url, input_text, pdf_bytes, analysis, ingest_mode):
+    """
+    Background job body in thin-client mode for structured analyses: the result is the JSON dict.
+    """
+    from server import analyze_remote_structured
+
+    return analyze_remote_structured(api_url, input_text, pdf_bytes, analysis, ingest_mode)
+
+def submit_remote_analyses(api_url, input_text, uploaded_file, analysis_options, ingest_mode, structured=False):
+    """
+    Queue one job per analysis that uploads the resume to the analysis service at `api_url`.
+    With `structured`, analyses that have a JSON schema are requested with format=json.
+    Returns (analysis, job_id) pairs.
+    """
+    from structured import SCHEMAS
+
+    queue = get_job_queue()
+    pdf_bytes = bytes(read_upload(uploaded_file))
+    submitted = []
+    for option in analysis_options:
+        as_json = structured and option in SCHEMAS
+        mode = ingest_mode_for(option, ingest_mode)
+        key = content_key(pdf_bytes, {"api": api_url, "input": input_text, "analysis": option,
+                                      "ingest": mode, "json": as_json})
+        job = remote_structured_job if as_json else remote_analysis_job
+        submitted.append((option, queue.submit(key, job, api_url, input_text, pdf_bytes, option, mode)))
+    return submitted
+
+def resume_text(uploaded_file):
+    """
+    Return the plain text layer of the uploaded resume (empty for scanned PDFs).
+    """
+    return "\n".join(extract_page_texts(read_upload(uploaded_file)))
+
+def instant_scores(input_text, uploaded_file, analysis_options, explain_scores, instant):
+    """
+    Score the analyses the local scorer supports, appending (title, markdown) pairs to `instant`.
+    Returns the analyses that still need the model.
+    """
+    local_options = [option for option in analysis_options if option in LOCAL_SCORED]
+    if not local_options:
+        return analysis_options
+
+    from scorer import format_score, score_resume
+
+    text = resume_text(uploaded_file)
+    if not text.strip():
+        instant.append(("Instant scores unavailable", "No text layer found in the resume; using the model for scoring."))
+        return analysis_options
+
+    with span("local_score"):
+        result = score_resume(input_text, text)
+    for option in local_options:
+        instant.append(("%s (instant)" % option, format_score(result, option)))
+    if explain_scores:
+        return analysis_options
+    return [option for option in analysis_options if option not in LOCAL_SCORED]
+
+def show_job_matches(uploaded_file, k=20):
+    """
+    List the openings in the job index (ATS_JOB_INDEX) that best fit the uploaded resume.
+    """
+    import streamlit as st
+    from jobindex import JobIndex
+
+    text = resume_text(uploaded_file)
+    if not text.strip():
+        st.info("No text layer found in the resume; job matching needs extractable text.")
+        return
+    matches = JobIndex(os.getenv("ATS_JOB_INDEX")).search(text, k)
+    st.subheader("Best Matching Openings")
+    if not matches:
+        st.write("No matching openings found.")
+    for rank, (job_id, title, score) in enumerate(matches, start=1):
+        st.write("%d. **%s** %s (score %.2f)" % (rank, job_id, title or "", score))
+
+def perform_analysis(input_text, uploaded_file, analysis_options, explain_scores, ingest_mode, structured=False):
+    """
+    Handle one click of "Perform Analysis": compute instant scores and queue model jobs.
+    In structured mode the model is always asked, since its JSON is the point of the request.
+    Returns the state that show_results renders (kept in st.session_state across reruns).
+    """
+    state = {"instant": [], "jobs": [], "payload": None}
+    analysis_options = [option for option in analysis_options if option in PROMPTS]
+    if not analysis_options:
+        state["instant"].append(("No analysis", "Please select a valid analysis type."))
+        return state
+
+    analysis_options = instant_scores(
+        input_text, uploaded_file, analysis_options, explain_scores or structured, state["instant"]
+    )
+    api_url = os.getenv("ATS_API_URL")
+    if analysis_options and api_url:
+        # Thin client: rendering and model calls happen in the analysis service
+        state["jobs"] = submit_remote_analyses(
+            api_url, input_text, uploaded_file, analysis_options, ingest_mode, structured
+        )
+    elif analysis_options:
+        payloads = []
+        for mode, options in ingest_groups(analysis_options, ingest_mode).items():
+            pdf_parts = prepare_resume(uploaded_file, mode)
+            payloads.append("%.0f KB in %d part(s) (%s)" % (payload_size(pdf_parts) / 1024, len(pdf_parts), mode))
+            state["jobs"].extend(submit_analyses(input_text, pdf_parts, options, structured))
+        state["jobs"].sort(key=lambda submitted: analysis_options.index(submitted[0]))
+        state["payload"] = "Resume payload: %s" % "; ".join(payloads)
+    return state
+
+def show_results(state):
+    """
+    Render instant scores and background jobs. While any job is still running,
+    the page reruns itself every ATS_POLL_INTERVAL seconds to show progress.
+    """
+    import streamlit as st
+
+    if state["payload"]:
+        st.sidebar.caption(state["payload"])
+    for title, markdown in state["instant"]:
+        st.subheader(title)
+        st.markdown(markdown)
+
+    queue = get_job_queue()
+    pending = False
+    for option, job_id in state["jobs"]:
+        st.subheader(option if len(state["jobs"]) > 1 or state["instant"] else "Response")
+        job = queue.get(job_id)
+        if job is None:
+            st.warning("This result has expired; please run the analysis again.")
+            continue
+        with span("render_output", analysis=option):
+            if job.status == "error":
+                st.error("Analysis failed: %s" % job.error)
+            elif job.status == "done":
+                st.write(job.text)
+                if "total" in job.timings:
+                    st.caption("First token after %.2fs, completed in %.2fs%s" % (
+                        job.timings["first_token"], job.timings["total"], " (cached)" if job.timings["cached"] else ""))
+            else:
+                pending = True
+                if job.chunks:
+                    st.write(job.text)
+                st.caption("Generating response...")
+    if pending:
+        time.sleep(float(os.getenv("ATS_POLL_INTERVAL", "0.5")))
+        st.rerun()
+
 def main():
     """
     Main function to run the Streamlit app.
     """
+    import streamlit as st
+
     st.set_page_config(page_title="ATS Resume Expert", layout="wide")
+    # Create the model client (and warm it up in the background) before the first request,
+    # unless analyses are delegated to the analysis service
+    if not os.getenv("ATS_API_URL"):
+        get_client()
+    start_metrics_server()
 
     st.title("ATS Tracking System")
     st.write("Welcome to the ATS Tracking System. Upload your resume and get detailed insights based on job descriptions.")
@@ -59,95 +556,67 @@ def main():
         input_text = st.text_area("Job Description: ", key="input")
         uploaded_file = st.file_uploader("Upload your resume (PDF)...", type=["pdf"])
 
-        # Dropdown menu for analysis type
-        analysis_option = st.selectbox(
-            "Select Analysis Type",
-            [
-                "Resume Evaluation",
-                "Skill Improvement",
-                "Percentage Match",
-                "Keywords Missing",
-                "Resume Formatting Suggestions",
-                "Cover Letter Review",
-                "Interview Preparation Tips",
-                "Salary Expectation Analysis",
-                "Career Path Suggestions",
-                "Soft Skills Evaluation",
-                "LinkedIn Profile Optimization",
-                "Networking Tips",
-                "Technical Skill Gap Analysis",
-                "Project Experience Evaluation",
-                "Certifications and Courses Recommendations",
-                "Industry-Specific Insights",
-                "Work-Life Balance Tips",
-                "Remote Work Suitability",
-                "Role Transition Strategy",
-                "Freelancing Skills Assessment",
-                "Freelancer Portfolio Enhancement",
-                "Freelancing Market Demand Analysis",
-                "Role-Specific Skill Development Plan",
-                "Building a Personal Brand for Freelancing",
-                "Freelancing Networking Strategies",
-                "Freelance Contract and Pricing Advice",
-                "Freelancing Tools and Resources Recommendations",
-                "Freelance Project Management Tips"
-            ],
-            help="Choose the type of analysis you want to perform."
+        # Analysis type: a single dropdown, or several at once in multi-analysis mode
+        multi_mode = st.checkbox("Run several analyses at once", help="Prepare the resume once and run the selected analyses in parallel.")
+        if multi_mode:
+            analysis_options = st.multiselect(
+                "Select Analysis Types",
+                list(PROMPTS),
+                default=["Resume Evaluation"],
+                help="Choose the types of analysis you want to perform."
+            )
+        else:
+            analysis_option = st.selectbox(
+                "Select Analysis Type",
+                list(PROMPTS),
+                help="Choose the type of analysis you want to perform."
+            )
+            analysis_options = [analysis_option]
+
+        ingest_label = st.radio(
+            "Resume ingestion",
+            list(INGEST_MODES),
+            help="Text layer is faster; scanned pages are still sent as images."
+        )
+
+        explain_scores = st.checkbox(
+            "Add model explanation to instant scores",
+            help="Percentage Match and Keywords Missing are scored locally first; tick to also ask the model."
+        )
+
+        structured = st.checkbox(
+            "Structured JSON output",
+            help="Percentage Match, Keywords Missing and Technical Skill Gap Analysis return schema-checked JSON "
+                 "with a bounded length."
         )
 
         st.write("For detailed analysis, click on the corresponding button below.")
         submit_button = st.button("Perform Analysis")
+        match_jobs_button = bool(os.getenv("ATS_JOB_INDEX")) and st.button("Find Best Matching Openings")
 
     if uploaded_file:
         st.sidebar.write("PDF Uploaded Successfully")
 
+    if match_jobs_button:
+        if uploaded_file:
+            show_job_matches(uploaded_file)
+        else:
+            st.sidebar.write("Please upload the resume")
+
     if submit_button:
         if uploaded_file:
-            pdf_parts = input_pdf_setup(uploaded_file)
-            st.spinner(text="Generating response...")
-
-            # Define prompts
-            prompts = {
-                "Resume Evaluation": "As a highly experienced career consultant with a deep understanding of industry standards, evaluate the provided resume against the given job description. Provide a thorough assessment of the candidate's qualifications, including strengths and weaknesses, and offer actionable recommendations to enhance their suitability for the role.",
-                "Skill Improvement": "Analyze the candidate’s technical and soft skills in relation to the job description. Identify specific skill gaps and provide a detailed plan for skill enhancement, including relevant courses, certifications, and practical steps to improve proficiency.",
-                "Percentage Match": "Calculate the percentage match between the candidate's resume and the job description using advanced matching criteria. Provide a detailed breakdown of the match, including an analysis of how well the resume aligns with each requirement and suggestions for closing any gaps.",
-                "Keywords Missing": "Conduct a comprehensive analysis of the resume and job description to identify missing keywords or phrases. Explain the significance of these keywords and provide a list of recommended terms to enhance the resume’s alignment with the job requirements.",
-                "Resume Formatting Suggestions": "Review the formatting of the resume with a focus on professional presentation. Offer detailed suggestions to improve visual appeal, readability, and effectiveness, addressing aspects such as layout, font choice, section headings, and overall design.",
-                "Cover Letter Review": "Evaluate the effectiveness of the provided cover letter in complementing the resume and addressing the job description. Provide a detailed critique on its structure, content, and how well it communicates the candidate's fit for the position, with suggestions for refinement.",
-                "Interview Preparation Tips": "Based on the resume and job description, provide targeted advice for preparing for an interview. Include strategies for handling common interview questions, addressing potential challenges, and presenting key qualifications in a compelling manner.",
-                "Salary Expectation Analysis": "Analyze the candidate’s salary expectations in the context of the job description and industry standards. Provide insights into the reasonableness of these expectations and suggest adjustments based on current market conditions and the candidate’s experience level.",
-                "Career Path Suggestions": "Based on the candidate’s resume and job description, offer well-researched recommendations for potential career paths. Include advice on exploring new roles or industries, leveraging current skills, and positioning oneself for future opportunities.",
-                "Soft Skills Evaluation": "Assess the soft skills highlighted in the resume and their relevance to the job description. Provide a detailed evaluation of how these skills align with the role and suggest areas for further development to enhance the candidate’s overall profile.",
-                "LinkedIn Profile Optimization": "Review the candidate’s LinkedIn profile in relation to their resume and job description. Offer a comprehensive set of recommendations for optimizing the profile to enhance visibility, engagement, and alignment with career goals.",
-                "Networking Tips": "Provide expert advice on effective networking strategies tailored to the candidate’s career goals and job description. Include specific tactics for building professional relationships, leveraging social media, and participating in industry events to expand their network.",
-                "Technical Skill Gap Analysis": "Conduct a detailed analysis of the technical skills listed on the resume compared to those required by the job description. Identify any gaps and offer a strategic plan for acquiring necessary skills, including recommended resources and training programs.",
-                "Project Experience Evaluation": "Evaluate the project experience detailed in the resume. Provide a thorough assessment of how these projects are presented, their relevance to the job description, and suggestions for enhancing their impact and effectiveness in showcasing the candidate’s expertise.",
-                "Certifications and Courses Recommendations": "Based on the job description and resume, recommend relevant certifications and courses that can enhance the candidate’s qualifications. Provide details on how these certifications will benefit the candidate and improve their prospects for the role.",
-                "Industry-Specific Insights": "Offer an in-depth analysis of industry-specific trends, challenges, and opportunities based on the resume and job description. Provide actionable insights on how the candidate can align their skills and experience with these industry dynamics.",
-                "Work-Life Balance Tips": "Provide expert recommendations for maintaining a healthy work-life balance based on the job description and the candidate’s career goals. Include practical strategies for managing stress, setting boundaries, and achieving a balanced lifestyle.",
-                "Remote Work Suitability": "Assess the candidate’s suitability for remote work based on their resume and the job description. Offer a detailed analysis of their skills and experience in relation to remote work requirements, and suggest any adjustments to better prepare for remote roles.",
-                "Role Transition Strategy": "Develop a comprehensive strategy for transitioning to a new role or industry based on the candidate’s resume and job description. Include actionable steps for acquiring new skills, building a relevant network, and adapting to the new role effectively.",
-                "Freelancing Skills Assessment": "Evaluate the skills necessary for a successful freelancing career based on the resume and job description. Provide detailed recommendations for developing these skills, including practical advice for transitioning to freelance work and building a strong client base.",
-                "Freelancer Portfolio Enhancement": "Review the freelancer’s portfolio and offer expert suggestions for enhancing its quality and impact. Focus on improving presentation, showcasing key projects, and aligning the portfolio with industry standards and client expectations.",
-                "Freelancing Market Demand Analysis": "Analyze the current market demand for freelance work in the candidate’s field based on their resume and job description. Provide insights into trends, opportunities, and strategies for positioning oneself effectively in the freelance market.",
-                "Role-Specific Skill Development Plan": "Create a detailed skill development plan for transitioning into a new role based on the candidate’s resume and job description. Include specific recommendations for training programs, certifications, and practical experience needed to excel in the new role.",
-                "Building a Personal Brand for Freelancing": "Guide the candidate on developing and enhancing their personal brand for freelancing. Provide comprehensive advice on marketing strategies, building an online presence, and positioning oneself as a leader in their freelance niche.",
-                "Freelancing Networking Strategies": "Offer strategic advice on networking for freelancers. Include tactics for connecting with potential clients, leveraging industry connections, and using social media effectively to build and maintain a professional network.",
-                "Freelance Contract and Pricing Advice": "Provide expert guidance on drafting freelance contracts and setting pricing strategies. Include tips on creating clear agreements, negotiating terms, and determining fair rates based on industry standards and the freelancer’s expertise.",
-                "Freelancing Tools and Resources Recommendations": "Recommend essential tools and resources for freelancers to manage their work effectively. Include suggestions for project management, client communication, and productivity tools that can streamline operations and enhance efficiency.",
-                "Freelance Project Management Tips": "Offer professional advice on managing freelance projects successfully. Include strategies for time management, client communication, project planning, and delivering high-quality results on time and within budget."
-            }
-
-            prompt = prompts.get(analysis_option, "Invalid option selected.")
-            if prompt != "Invalid option selected.":
-                response = get_gemini_response(input_text, pdf_parts, prompt)
-                st.subheader("Response")
-                st.write(response)
-            else:
-                st.write("Please select a valid analysis type.")
+            # Only the model spans carry an analysis label; a joined selection would add a series per combination
+            with span("main", analyses=len(analysis_options)):
+                st.session_state["analysis"] = perform_analysis(
+                    input_text, uploaded_file, analysis_options, explain_scores, INGEST_MODES[ingest_label], structured
+                )
         else:
             st.sidebar.write("Please upload the resume")
 
+    # Results live in the session so they survive reruns while background jobs finish
+    if "analysis" in st.session_state:
+        show_results(st.session_state["analysis"])
+
 if __name__ == "__main__":
     main()
 
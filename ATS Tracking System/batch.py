@@ -0,0 +1,209 @@
+"""
+Headless batch mode: rank a directory of resume PDFs against one job description.
+
+Example:
+    python batch.py --job-description jd.txt --resumes resumes/ --output results.jsonl \
+        --analysis "Percentage Match" --concurrency 8 --rate 60
+"""
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from app import cached_profile, distill_profile, get_gemini_response, ingest_groups, prepare_resume, profile_parts
+from app import structured_gemini_response
+from prompts import PROMPTS
+from quota import BATCH, set_default_priority
+from structured import SCHEMAS
+
+CSV_FIELDS = ["resume", "analysis", "response", "error", "seconds"]
+
+
+def rasterize_resume(path, mode="text"):
+    """
+    Turn a resume file into content parts (text layer or page image). Executed inside a worker process.
+    """
+    with open(path, "rb") as f:
+        return prepare_resume(f, mode)
+
+
+class RateLimiter:
+    """
+    Spaces out request starts so that at most `per_minute` begin each minute.
+    """
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class ResultWriter:
+    """
+    Appends each result to a JSONL or CSV file as soon as it is available.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._csv = None
+        if path.lower().endswith(".csv"):
+            self._csv = csv.DictWriter(self._file, fieldnames=CSV_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, record):
+        if self._csv is not None:
+            if isinstance(record["response"], dict):
+                record = dict(record, response=json.dumps(record["response"], ensure_ascii=False))
+            self._csv.writerow(record)
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+async def resume_profile(path, pool, semaphore, limiter):
+    """
+    Return the distilled profile parts of a resume. The text layer is prepared in the process pool;
+    the distillation model call runs here, under the same concurrency and rate limits as analyses.
+    """
+    with open(path, "rb") as f:
+        pdf_bytes = f.read()
+    profile = await asyncio.to_thread(cached_profile, pdf_bytes)
+    if profile is None:
+        text_parts = await asyncio.get_running_loop().run_in_executor(pool, rasterize_resume, path, "text")
+        async with semaphore:
+            await limiter.wait()
+            profile = await asyncio.to_thread(distill_profile, pdf_bytes, text_parts)
+    return profile_parts(profile)
+
+
+async def process_resume(path, job_description, analyses, pool, semaphore, limiter, writer, mode,
+                         structured=False):
+    """
+    Rasterize one resume in the process pool, then run each analysis against it.
+    The resume is prepared once per ingestion mode the analyses need (formatting analyses use page images).
+    With `structured`, analyses that have a JSON schema are written as validated JSON.
+    """
+    loop = asyncio.get_running_loop()
+    name = os.path.basename(path)
+    parts = {}
+    try:
+        for ingest, options in ingest_groups(analyses, mode).items():
+            if ingest == "profile":
+                pdf_parts = await resume_profile(path, pool, semaphore, limiter)
+            else:
+                pdf_parts = await loop.run_in_executor(pool, rasterize_resume, path, ingest)
+            parts.update(dict.fromkeys(options, pdf_parts))
+    except Exception as e:
+        for analysis in analyses:
+            writer.write({"resume": name, "analysis": analysis, "response": None,
+                          "error": "rasterize failed: %s" % e, "seconds": 0.0})
+        return
+
+    async def analyse(analysis):
+        async with semaphore:
+            await limiter.wait()
+            start = time.monotonic()
+            record = {"resume": name, "analysis": analysis, "response": None, "error": None}
+            try:
+                if structured and analysis in SCHEMAS:
+                    record["response"] = await asyncio.to_thread(
+                        structured_gemini_response, job_description, parts[analysis], analysis
+                    )
+                else:
+                    record["response"] = await asyncio.to_thread(
+                        get_gemini_response, job_description, parts[analysis], PROMPTS[analysis]
+                    )
+            except Exception as e:
+                record["error"] = str(e)
+            record["seconds"] = round(time.monotonic() - start, 3)
+            writer.write(record)
+
+    await asyncio.gather(*(analyse(analysis) for analysis in analyses))
+
+
+async def run_batch(job_description, paths, analyses, output, concurrency=4, rate=0, workers=None, mode="text",
+                    structured=False):
+    """
+    Process every resume in `paths`, writing one record per (resume, analysis) pair to `output`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(rate)
+    writer = ResultWriter(output)
+    # Resumes in flight: enough to keep every pool worker and model slot busy. More would only hold
+    # prepared payloads in memory while they wait for a model slot.
+    in_flight = asyncio.Semaphore((workers or os.cpu_count() or 1) + concurrency)
+
+    async def bounded(path, pool):
+        async with in_flight:
+            await process_resume(path, job_description, analyses, pool, semaphore, limiter, writer, mode, structured)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            await asyncio.gather(*(bounded(path, pool) for path in paths))
+    finally:
+        writer.close()
+
+
+def find_resumes(directory):
+    """
+    Return the sorted list of PDF files in a directory.
+    """
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.lower().endswith(".pdf")
+    )
+
+
+def main():
+    """
+    Parse command-line arguments and run the batch.
+    """
+    parser = argparse.ArgumentParser(description="Rank resume PDFs against a job description.")
+    parser.add_argument("--job-description", required=True, help="Path to a text file with the job description.")
+    parser.add_argument("--resumes", required=True, help="Directory containing resume PDFs.")
+    parser.add_argument("--output", required=True, help="Output file (.jsonl or .csv).")
+    parser.add_argument("--analysis", action="append", choices=list(PROMPTS),
+                        help="Analysis type to run; may be repeated. Defaults to Percentage Match.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum model calls in flight.")
+    parser.add_argument("--rate", type=float, default=0, help="Maximum model calls started per minute (0 = unlimited).")
+    parser.add_argument("--ingest", choices=["text", "image", "profile"], default="text",
+                        help="Send the resume text layer (with image fallback), the first page image, "
+                             "or a profile distilled once per resume. Formatting analyses always use page images.")
+    parser.add_argument("--workers", type=int, default=None, help="Rasterization worker processes.")
+    parser.add_argument("--structured", action="store_true",
+                        help="Return schema-validated JSON for %s." % ", ".join(SCHEMAS))
+    args = parser.parse_args()
+    # Interactive sessions sharing the model quota go first
+    set_default_priority(BATCH)
+
+    with open(args.job_description, encoding="utf-8") as f:
+        job_description = f.read()
+    paths = find_resumes(args.resumes)
+    analyses = args.analysis or ["Percentage Match"]
+
+    start = time.monotonic()
+    asyncio.run(run_batch(job_description, paths, analyses, args.output,
+                          args.concurrency, args.rate, args.workers, args.ingest, args.structured))
+    print("Processed %d resumes in %.1fs -> %s" % (len(paths), time.monotonic() - start, args.output))
+
+
+if __name__ == "__main__":
+    main()
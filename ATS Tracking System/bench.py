@@ -0,0 +1,255 @@
+"""
+Offline benchmark for the resume pipeline.
+
+Generates synthetic resume PDFs of varying page counts and text densities,
+times each stage of input_pdf_setup (read, rasterize, JPEG encode, base64),
+request assembly, and end-to-end get_gemini_response against a local fake
+model server with configurable latency. Results are written as JSON; with
+--baseline, any metric slower than the baseline by more than --threshold
+(and by at least MIN_REGRESSION_SECONDS) fails the run.
+
+    python bench.py --output bench_results.json
+    python bench.py --baseline bench_baseline.json --threshold 0.2
+    python bench.py --update-baseline bench_baseline.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import statistics
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bench runs must never hit the real model or reuse earlier results
+os.environ["ATS_RESPONSE_CACHE"] = "0"
+os.environ["ATS_RENDER_CACHE_DISK"] = "0"
+os.environ["ATS_MODEL_BACKEND"] = "http"
+os.environ["ATS_TRACE_LOG"] = "0"
+
+# Slowdowns smaller than this are timer noise on sub-millisecond stages, whatever the percentage
+MIN_REGRESSION_SECONDS = 0.001
+
+# (name, pages, lines per page)
+SCENARIOS = [
+    ("1p-sparse", 1, 20),
+    ("1p-dense", 1, 60),
+    ("2p-dense", 2, 60),
+    ("5p-dense", 5, 60),
+]
+
+WORDS = (
+    "python java sql aws docker kubernetes led team delivered project managed stakeholders built "
+    "pipeline data analytics machine learning model production api service reduced latency improved "
+    "revenue customer engineering design architecture testing deployment cloud platform scalable"
+).split()
+
+
+def make_pdf(pages, lines_per_page, seed=0):
+    """
+    Build a minimal text PDF (Helvetica, US Letter) without third-party libraries.
+    """
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page in range(pages):
+        lines = ["BT /F1 10 Tf 50 750 Td 12 TL"]
+        lines.append("(Candidate Name - Page %d) Tj T*" % (page + 1))
+        for _ in range(lines_per_page - 1):
+            text = " ".join(rng.choice(WORDS) for _ in range(12))
+            lines.append("(%s) Tj T*" % text)
+        lines.append("ET")
+        stream = "\n".join(lines).encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+class FakeModelHandler(BaseHTTPRequestHandler):
+    """
+    Fake model endpoint: waits `latency` seconds, then answers /generate with JSON
+    or /stream with newline-delimited JSON chunks.
+    """
+    latency = 0.05
+    chunks = 8
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        contents = json.loads(body)["contents"]
+        time.sleep(self.latency)
+        text = "Fake analysis of %d content parts." % len(contents)
+        self.send_response(200)
+        if self.path == "/stream":
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for i in range(self.chunks):
+                self.wfile.write((json.dumps({"text": "%s [%d] " % (text, i)}) + "\n").encode())
+                self.wfile.flush()
+        else:
+            payload = json.dumps({"text": text}).encode()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(latency):
+    """
+    Start the fake model server on a free local port and return it.
+    """
+    handler = type("Handler", (FakeModelHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def timed(fn, repeats):
+    """
+    Run `fn` `repeats` times; return (median seconds, last result).
+    """
+    samples = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def run(repeats, latency):
+    """
+    Run every scenario and return {metric name: median seconds}.
+    """
+    server = start_fake_server(latency)
+    os.environ["ATS_MODEL_URL"] = "http://127.0.0.1:%d" % server.server_address[1]
+
+    from app import RENDER_SETTINGS, input_pdf_setup, get_gemini_response
+    from cache import get_render_cache, response_key
+    from payload import image_parts
+    from prompts import PROMPTS
+    from render import render_pages
+
+    results = {}
+    job_description = " ".join(WORDS)
+    prompt = PROMPTS["Resume Evaluation"]
+    for name, pages, lines in SCENARIOS:
+        pdf_bytes = make_pdf(pages, lines)
+        path = os.path.join(os.getenv("TMPDIR", "/tmp"), "ats-bench-%s.pdf" % name)
+        with open(path, "wb") as f:
+            f.write(pdf_bytes)
+
+        def read():
+            with open(path, "rb") as f:
+                return f.read()
+
+        results[name + "/read"], _ = timed(read, repeats)
+        results[name + "/rasterize"], images = timed(lambda: render_pages(
+            pdf_bytes,
+            first_page=RENDER_SETTINGS["first_page"],
+            last_page=RENDER_SETTINGS["last_page"],
+            profile=RENDER_SETTINGS["profile"],
+            max_pixels=RENDER_SETTINGS["max_pixels"],
+        ), repeats)
+        results[name + "/jpeg_encode"], pdf_parts = timed(lambda: image_parts(images), repeats)
+        results[name + "/base64"], _ = timed(
+            lambda: [base64.b64encode(part["data"]).decode() for part in pdf_parts], repeats)
+
+        def pdf_setup():
+            get_render_cache().memory.clear()
+            with open(path, "rb") as f:
+                return input_pdf_setup(f)
+
+        results[name + "/input_pdf_setup"], _ = timed(pdf_setup, repeats)
+        results[name + "/request_assembly"], _ = timed(lambda: (
+            [job_description, *pdf_parts, prompt],
+            response_key("bench", job_description, pdf_parts, prompt),
+        ), repeats)
+        results[name + "/get_gemini_response"], _ = timed(
+            lambda: get_gemini_response(job_description, pdf_parts, prompt), repeats)
+        os.remove(path)
+
+    server.shutdown()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the metrics that regressed by more than `threshold` (a fraction) against the baseline
+    and by at least MIN_REGRESSION_SECONDS.
+    """
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        base = baseline.get(name)
+        if base and seconds > base * (1 + threshold) and seconds - base >= MIN_REGRESSION_SECONDS:
+            regressions.append((name, base, seconds))
+    return regressions
+
+
+def main():
+    """
+    Parse arguments, run the benchmark and check for regressions.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the resume pipeline offline.")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake model server latency in seconds.")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before failing (0.2 = 20%%).")
+    parser.add_argument("--update-baseline", metavar="PATH", help="Write the results as the new baseline.")
+    args = parser.parse_args()
+
+    results = run(args.repeats, args.latency)
+    report = {
+        "python": sys.version.split()[0],
+        "repeats": args.repeats,
+        "latency": args.latency,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    for name, seconds in sorted(results.items()):
+        print("%-36s %9.2f ms" % (name, seconds * 1000))
+
+    if args.update_baseline:
+        with open(args.update_baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print("Baseline written to %s" % args.update_baseline)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, base, seconds in regressions:
+            print("REGRESSION %s: %.2f ms -> %.2f ms" % (name, base * 1000, seconds * 1000))
+        if regressions:
+            sys.exit(1)
+        print("No regressions beyond %.0f%%" % (args.threshold * 100))
+
+
+if __name__ == "__main__":
+    main()
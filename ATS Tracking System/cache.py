@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Default budgets for the rasterized resume cache
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 512 * 1024 * 1024
+DEFAULT_RESPONSE_TTL = 7 * 24 * 3600
+DEFAULT_RESPONSE_ENTRIES = 10000
+DEFAULT_PROFILE_TTL = 90 * 24 * 3600
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ats_cache")
+
+
+def content_key(data, settings=None):
+    """
+    Build a SHA-256 key from raw bytes plus the settings used to process them.
+    """
+    digest = hashlib.sha256(data)
+    if settings:
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class MemoryLRU:
+    """
+    In-process LRU cache bounded by the total size of the stored values.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        value_size = len(value)
+        if value_size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            self._items[key] = value
+            self.size += value_size
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+
+class DiskStore:
+    """
+    On-disk key/value store that evicts the least recently used files once it
+    grows past its byte budget.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        # Touch the file so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process since the read
+            return None
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        # Unique temp file: other threads and processes may be writing the same key
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=key + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".bin"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+class TwoTierCache:
+    """
+    Memory LRU in front of a disk store. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+
+_render_cache = None
+
+
+def get_render_cache():
+    """
+    Return the process-wide cache for rasterized resumes, configured from the environment.
+    """
+    global _render_cache
+    if _render_cache is None:
+        memory = MemoryLRU(int(os.getenv("ATS_RENDER_CACHE_MEMORY_BYTES", DEFAULT_MEMORY_BYTES)))
+        disk = None
+        if os.getenv("ATS_RENDER_CACHE_DISK", "1") != "0":
+            disk = DiskStore(
+                os.path.join(os.getenv("ATS_CACHE_DIR", DEFAULT_CACHE_DIR), "renders"),
+                int(os.getenv("ATS_RENDER_CACHE_DISK_BYTES", DEFAULT_DISK_BYTES)),
+            )
+        _render_cache = TwoTierCache(memory, disk)
+    return _render_cache
+
+
+def response_key(model_name, input_text, pdf_parts, prompt):
+    """
+    Build a cache key from the hashes of every input that shapes a model response.
+    """
+    digest = hashlib.sha256()
+    for text in (model_name, input_text, prompt):
+        digest.update(hashlib.sha256((text or "").encode()).digest())
+    for part in pdf_parts:
+        if isinstance(part, dict):
+            data = part["data"]
+            digest.update(part["mime_type"].encode())
+            digest.update(hashlib.sha256(data.encode() if isinstance(data, str) else data).digest())
+        else:
+            digest.update(hashlib.sha256(part.encode()).digest())
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of model responses with a TTL, an entry cap and LRU eviction.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_RESPONSE_TTL, max_entries=DEFAULT_RESPONSE_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_response_cache = None
+_profile_store = None
+
+
+def get_response_cache():
+    """
+    Return the process-wide model response cache, or None when disabled via ATS_RESPONSE_CACHE=0.
+    """
+    global _response_cache
+    if _response_cache is None and os.getenv("ATS_RESPONSE_CACHE", "1") != "0":
+        _response_cache = ResponseCache(
+            os.path.join(os.getenv("ATS_CACHE_DIR", DEFAULT_CACHE_DIR), "responses.sqlite3"),
+            float(os.getenv("ATS_RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_TTL)),
+            int(os.getenv("ATS_RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_RESPONSE_ENTRIES)),
+        )
+    return _response_cache
+
+
+def get_profile_store():
+    """
+    Return the process-wide store of distilled resume profiles (kept ATS_PROFILE_TTL seconds).
+    """
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = ResponseCache(
+            os.path.join(os.getenv("ATS_CACHE_DIR", DEFAULT_CACHE_DIR), "profiles.sqlite3"),
+            float(os.getenv("ATS_PROFILE_TTL", DEFAULT_PROFILE_TTL)),
+            int(os.getenv("ATS_PROFILE_MAX_ENTRIES", DEFAULT_RESPONSE_ENTRIES)),
+        )
+    return _profile_store
@@ -0,0 +1,612 @@
+"""
+Long-lived model client: one configured model object per process, warm-up,
+jittered exponential-backoff retries and optional hedged requests (for streams,
+hedging covers the wait for the first chunk).
+
+Configuration (environment):
+    ATS_MODEL_BACKEND           gemini (default), stub, or http (fake model server at ATS_MODEL_URL)
+    ATS_MODEL_RETRIES           retry attempts for retryable errors (default 3)
+    ATS_MODEL_BACKOFF           base backoff in seconds (default 0.5)
+    ATS_MODEL_MAX_BACKOFF       backoff ceiling in seconds (default 8)
+    ATS_MODEL_HEDGE_PERCENTILE  fire a second request once a call is slower than this
+                                latency percentile (default 0 = hedging off)
+    ATS_MODEL_HEDGE_AFTER       fixed hedge delay in seconds, overrides the percentile
+    ATS_CONTEXT_CACHE_TTL       upload the job description + resume once as a cached context and
+                                send only the analysis instruction per call (seconds, 0 = off)
+    ATS_CONTEXT_MODEL           versioned model name used for context caching
+    ATS_CONTEXT_MIN_TOKENS      smallest estimated prefix worth caching (default: Gemini's minimum)
+    ATS_QUOTA_*                 shared RPM/TPM scheduler every call waits on (see quota.py)
+    ATS_STUB_LATENCY, ATS_STUB_SLOW_RATE, ATS_STUB_SLOW_LATENCY, ATS_STUB_FAILURE_RATE
+                                behaviour of the local stub backend
+"""
+import os
+import json
+import time
+import queue
+import base64
+import random
+import urllib.error
+import urllib.request
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from cache import response_key
+from jobs import key_lock
+from quota import estimate_input_tokens, estimate_tokens, get_scheduler
+from tracing import record_usage, span
+
+MODEL_NAME = 'gemini-1.5-flash'
+CONTEXT_MODEL_NAME = 'models/gemini-1.5-flash-001'
+
+# Contexts this close to expiry (seconds) are recreated rather than reused
+CONTEXT_EXPIRY_MARGIN = 30
+# Smallest prefix (tokens) Gemini 1.5 accepts for context caching; smaller prefixes are sent in full
+GEMINI_MIN_CONTEXT_TOKENS = 32768
+# Prefixes remembered as rejected by the backend, so they are not offered again
+MAX_CONTEXT_FAILURES = 1024
+
+# Latency samples needed before the percentile hedge delay is trusted
+MIN_HEDGE_SAMPLES = 20
+
+
+class TransientError(Exception):
+    """
+    A failure worth retrying (raised by the stub backend).
+    """
+
+
+class ContextExpired(Exception):
+    """
+    The cached context used for a call no longer exists (raised by the stub backend).
+    """
+
+
+class GeminiBackend:
+    """
+    Google Generative AI backend holding a single configured model object.
+    """
+    supports_context = True
+    min_context_tokens = int(os.getenv("ATS_CONTEXT_MIN_TOKENS", GEMINI_MIN_CONTEXT_TOKENS))
+
+    def __init__(self, model_name=MODEL_NAME, context_model_name=CONTEXT_MODEL_NAME):
+        import google.generativeai as genai
+        from google.api_core import exceptions
+
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.genai = genai
+        self.model_name = model_name
+        self.context_model_name = context_model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.context_errors = (exceptions.NotFound, exceptions.PermissionDenied)
+        self._context_models = {}
+        self.retryable = (
+            exceptions.TooManyRequests,
+            exceptions.ResourceExhausted,
+            exceptions.ServiceUnavailable,
+            exceptions.InternalServerError,
+            exceptions.DeadlineExceeded,
+            ConnectionError,
+            TimeoutError,
+        )
+
+    def _model_for(self, context):
+        if context is None:
+            return self.model
+        model = self._context_models.get(context.name)
+        if model is None:
+            model = self._context_models[context.name] = self.genai.GenerativeModel.from_cached_content(context)
+        return model
+
+    def generate(self, contents, context=None, config=None):
+        response = self._model_for(context).generate_content(contents, generation_config=config)
+        record_usage(getattr(response, "usage_metadata", None))
+        return response.text
+
+    def stream(self, contents, context=None):
+        response = self._model_for(context).generate_content(contents, stream=True)
+        for chunk in response:
+            yield chunk.text
+        record_usage(getattr(response, "usage_metadata", None))
+
+    def create_context(self, contents, ttl):
+        import datetime
+        from google.generativeai import caching
+
+        return caching.CachedContent.create(
+            model=self.context_model_name, contents=contents, ttl=datetime.timedelta(seconds=ttl)
+        )
+
+    def drop_context(self, context):
+        self._context_models.pop(context.name, None)
+
+    def warm_up(self):
+        # Token counting opens the connection without paying for a generation
+        self.model.count_tokens("ping")
+
+    def is_retryable(self, error):
+        return isinstance(error, self.retryable)
+
+    def is_context_error(self, error):
+        return isinstance(error, self.context_errors)
+
+
+class StubBackend:
+    """
+    Local stand-in for the model with configurable latency, tail latency and failure rate.
+    """
+    supports_context = True
+    min_context_tokens = 0
+
+    def __init__(self, latency=0.05, slow_rate=0.0, slow_latency=1.0, failure_rate=0.0, seed=None):
+        self.model_name = "stub"
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.contexts = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tokens(contents):
+        # Rough token estimate: 4 characters per text token, a fixed cost per blob
+        return sum(len(part) // 4 if isinstance(part, str) else 258 for part in contents)
+
+    def _respond(self, contents, context=None, config=None):
+        with self._lock:
+            self.calls += 1
+            slow = self._random.random() < self.slow_rate
+            fail = self._random.random() < self.failure_rate
+            cached_tokens = 0
+            if context is not None:
+                entry = self.contexts.get(context)
+                if entry is None or entry[1] < time.time():
+                    self.contexts.pop(context, None)
+                    raise ContextExpired(context)
+                cached_tokens = self._tokens(entry[0])
+        time.sleep(self.slow_latency if slow else self.latency)
+        if fail:
+            raise TransientError("stub backend failure")
+        prompt = contents[-1] if contents and isinstance(contents[-1], str) else ""
+        if config and config.get("response_mime_type") == "application/json":
+            text = json.dumps({"stub": True, "prompt": prompt[:80]})
+        else:
+            text = "Stub response for: %s" % prompt[:80]
+        record_usage(_Usage(self._tokens(contents) + cached_tokens, len(text) // 4, cached_tokens))
+        return text
+
+    def generate(self, contents, context=None, config=None):
+        return self._respond(contents, context, config)
+
+    def stream(self, contents, context=None):
+        for word in self._respond(contents, context).split(" "):
+            yield word + " "
+
+    def create_context(self, contents, ttl):
+        with self._lock:
+            name = "stub-context-%d" % (len(self.contexts) + self.calls)
+            self.contexts[name] = (list(contents), time.time() + ttl)
+        return name
+
+    def drop_context(self, context):
+        with self._lock:
+            self.contexts.pop(context, None)
+
+    def warm_up(self):
+        pass
+
+    def is_retryable(self, error):
+        return isinstance(error, (TransientError, ConnectionError, TimeoutError))
+
+    def is_context_error(self, error):
+        return isinstance(error, ContextExpired)
+
+
+class _Usage:
+    # Mirrors the usage_metadata fields of a real response
+    def __init__(self, prompt_token_count, candidates_token_count, cached_content_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = cached_content_token_count
+
+
+class HttpBackend:
+    """
+    Backend for a local fake model server (see bench.py) speaking a small JSON protocol:
+    POST /generate and /stream with {"contents": [...]}; blobs are base64-encoded as in the REST API.
+    """
+    supports_context = False
+    min_context_tokens = 0
+
+    def __init__(self, url, timeout=60):
+        self.model_name = "http:" + url
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, contents, config=None):
+        body = json.dumps({"contents": [
+            {"mime_type": part["mime_type"], "data": base64.b64encode(part["data"]).decode()}
+            if isinstance(part, dict) else part
+            for part in contents
+        ], "generation_config": config}).encode()
+        request = urllib.request.Request(self.url + path, data=body, headers={"Content-Type": "application/json"})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def generate(self, contents, context=None, config=None):
+        with self._request("/generate", contents, config) as response:
+            return json.load(response)["text"]
+
+    def stream(self, contents, context=None):
+        with self._request("/stream", contents) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)["text"]
+
+    def warm_up(self):
+        pass
+
+    def create_context(self, contents, ttl):
+        # The fake model server has no context caching
+        return None
+
+    def drop_context(self, context):
+        pass
+
+    def is_retryable(self, error):
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code in (429, 500, 502, 503, 504)
+        return isinstance(error, (urllib.error.URLError, ConnectionError, TimeoutError))
+
+    def is_context_error(self, error):
+        return False
+
+
+class ModelClient:
+    """
+    Wraps a backend with retries (jittered exponential backoff) and optional hedging.
+    """
+
+    def __init__(self, backend, retries=3, backoff=0.5, max_backoff=8.0,
+                 hedge_percentile=0, hedge_after=None, max_workers=32, context_ttl=0, scheduler=None):
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after = hedge_after
+        self.hedged = 0
+        self._queued = 0
+        self.context_ttl = context_ttl
+        self.scheduler = scheduler
+        self._contexts = {}
+        self._context_failures = OrderedDict()
+        self._context_lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model")
+        self._warm = threading.Event()
+
+    def warm_up(self, background=True):
+        """
+        Open the backend connection ahead of the first real request.
+        """
+        def run():
+            try:
+                self.backend.warm_up()
+            except Exception:
+                pass
+            finally:
+                self._warm.set()
+
+        if self._warm.is_set():
+            return
+        if background:
+            threading.Thread(target=run, daemon=True).start()
+        else:
+            run()
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt))))
+
+    def _with_retries(self, fn, *args):
+        attempt = 0
+        while True:
+            try:
+                return fn(*args)
+            except Exception as e:
+                if attempt >= self.retries or not self.backend.is_retryable(e):
+                    raise
+                self._sleep_before_retry(attempt)
+                attempt += 1
+
+    def _slot(self, contents, config=None):
+        # Every attempt, retry or hedge takes its own slot: each one spends provider quota
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(estimate_tokens(contents, config), self.backend.is_retryable)
+
+    def _scheduled_generate(self, contents, context=None, config=None):
+        with self._slot(contents, config):
+            return self.backend.generate(contents, context, config)
+
+    def _timed_call(self, contents, context=None, config=None):
+        start = time.perf_counter()
+        result = self._with_retries(self._scheduled_generate, contents, context, config)
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return result
+
+    def hedge_delay(self):
+        """
+        Seconds to wait before firing a hedge request, or None when hedging is off.
+        """
+        if self.hedge_after is not None:
+            return self.hedge_after
+        if not self.hedge_percentile:
+            return None
+        with self._lock:
+            if len(self._latencies) < MIN_HEDGE_SAMPLES:
+                return None
+            samples = sorted(self._latencies)
+        index = min(int(len(samples) * self.hedge_percentile / 100), len(samples) - 1)
+        return samples[index]
+
+    def _submit(self, started, fn, *args):
+        # Run fn on the executor; `started` is set once a worker thread picks it up
+        def run():
+            with self._lock:
+                self._queued -= 1
+            started.set()
+            return fn(*args)
+
+        with self._lock:
+            self._queued += 1
+        return self._executor.submit(contextvars.copy_context().run, run)
+
+    def _start_hedge(self):
+        # A hedge would only queue behind other calls when the executor is backlogged,
+        # doubling load exactly when the system is overloaded
+        with self._lock:
+            if self._queued:
+                return False
+            self.hedged += 1
+            return True
+
+    def generate(self, contents, context=None, config=None):
+        """
+        Return the model's text for `contents`, retrying and hedging as configured.
+        `config` is passed to the backend as the generation config (e.g. max_output_tokens).
+        """
+        delay = self.hedge_delay()
+        if delay is None:
+            return self._timed_call(contents, context, config)
+
+        started = threading.Event()
+        primary = self._submit(started, self._timed_call, contents, context, config)
+        # The hedge delay counts from when the primary runs, not from when it was queued
+        started.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._start_hedge():
+            return primary.result()
+        pending = {primary, self._submit(threading.Event(), self._timed_call, contents, context, config)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stream(self, contents, context=None):
+        """
+        Yield text chunks. Retries apply until the first chunk has been received. With hedging on,
+        a second stream is started when the first chunk is slower than the hedge delay, and the
+        stream whose first chunk arrives first is used.
+        """
+        delay = self.hedge_delay()
+        if delay is None:
+            yield from self._stream_attempts(contents, context)
+            return
+
+        events = queue.Queue()
+        stop = [threading.Event(), threading.Event()]
+
+        def produce(index):
+            try:
+                for chunk in self._stream_attempts(contents, context):
+                    if stop[index].is_set():
+                        return
+                    events.put((index, chunk, None))
+                events.put((index, None, None))
+            except Exception as e:
+                events.put((index, None, e))
+
+        started = threading.Event()
+        self._submit(started, produce, 0)
+        try:
+            started.wait()
+            try:
+                first = [events.get(timeout=delay)]
+            except queue.Empty:
+                first = []
+            live = 1
+            if not first and self._start_hedge():
+                self._submit(threading.Event(), produce, 1)
+                live = 2
+            winner = None
+            while True:
+                index, chunk, error = first.pop() if first else events.get()
+                if winner is None:
+                    if error is not None:
+                        live -= 1
+                        if live:
+                            # The other stream may still answer
+                            continue
+                        raise error
+                    winner = index
+                    stop[1 - index].set()
+                if index != winner:
+                    continue
+                if error is not None:
+                    raise error
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            for event in stop:
+                event.set()
+
+    def _stream_attempts(self, contents, context=None):
+        # One stream, retried until its first chunk has been received
+        attempt = 0
+        while True:
+            received = False
+            try:
+                with self._slot(contents):
+                    for chunk in self.backend.stream(contents, context):
+                        received = True
+                        yield chunk
+                return
+            except Exception as e:
+                if received or attempt >= self.retries or not self.backend.is_retryable(e):
+                    raise
+                self._sleep_before_retry(attempt)
+                attempt += 1
+
+    def _known_context(self, key):
+        # (handle, rejected) for a prefix key; drops contexts that are about to expire
+        now = time.time()
+        with self._context_lock:
+            for stale in [k for k, (_, expires) in self._contexts.items() if expires - CONTEXT_EXPIRY_MARGIN < now]:
+                self.backend.drop_context(self._contexts.pop(stale)[0])
+            if key in self._contexts:
+                return self._contexts[key][0], False
+            return None, key in self._context_failures
+
+    def shared_context(self, prefix):
+        """
+        Return a cached-context handle for `prefix` (job description + resume), creating it on
+        first use. Returns None when context caching is off, the prefix is below the backend's
+        minimum cacheable size, or the backend rejected it before; such prefixes are sent in full.
+        """
+        if not self.context_ttl or not self.backend.supports_context:
+            return None
+        if estimate_input_tokens(prefix) < self.backend.min_context_tokens:
+            return None
+        key = response_key(self.model_name, "", prefix, "shared-context")
+        handle, rejected = self._known_context(key)
+        if handle is not None or rejected:
+            return handle
+        # Only callers with this prefix wait for its creation; other calls proceed
+        with key_lock("context:" + key):
+            handle, rejected = self._known_context(key)
+            if handle is not None or rejected:
+                return handle
+            try:
+                with span("context_create"):
+                    handle = self.backend.create_context(prefix, self.context_ttl)
+            except Exception:
+                handle = None
+            with self._context_lock:
+                if handle is None:
+                    self._context_failures[key] = True
+                    if len(self._context_failures) > MAX_CONTEXT_FAILURES:
+                        self._context_failures.popitem(last=False)
+                    return None
+                self._contexts[key] = (handle, time.time() + self.context_ttl)
+            return handle
+
+    def _forget_context(self, prefix, handle):
+        key = response_key(self.model_name, "", prefix, "shared-context")
+        with self._context_lock:
+            if key in self._contexts and self._contexts[key][0] is handle:
+                del self._contexts[key]
+        self.backend.drop_context(handle)
+
+    def generate_with_prefix(self, prefix, suffix, config=None):
+        """
+        Generate for prefix + suffix, sending only `suffix` against a shared cached context when
+        context caching is enabled. Falls back to sending everything if the context has expired.
+        """
+        context = self.shared_context(prefix)
+        if context is not None:
+            try:
+                return self.generate(suffix, context, config)
+            except Exception as e:
+                if not self.backend.is_context_error(e):
+                    raise
+                self._forget_context(prefix, context)
+        return self.generate(prefix + suffix, config=config)
+
+    def stream_with_prefix(self, prefix, suffix):
+        """
+        Streaming counterpart of generate_with_prefix.
+        """
+        context = self.shared_context(prefix)
+        if context is not None:
+            received = False
+            try:
+                for chunk in self.stream(suffix, context):
+                    received = True
+                    yield chunk
+                return
+            except Exception as e:
+                if received or not self.backend.is_context_error(e):
+                    raise
+                self._forget_context(prefix, context)
+        yield from self.stream(prefix + suffix)
+
+
+def client_from_env():
+    """
+    Build a ModelClient from the ATS_MODEL_* / ATS_STUB_* environment variables.
+    """
+    backend_name = os.getenv("ATS_MODEL_BACKEND", "gemini")
+    if backend_name == "http":
+        backend = HttpBackend(os.getenv("ATS_MODEL_URL", "http://127.0.0.1:8765"))
+    elif backend_name == "stub":
+        backend = StubBackend(
+            latency=float(os.getenv("ATS_STUB_LATENCY", "0.05")),
+            slow_rate=float(os.getenv("ATS_STUB_SLOW_RATE", "0")),
+            slow_latency=float(os.getenv("ATS_STUB_SLOW_LATENCY", "1.0")),
+            failure_rate=float(os.getenv("ATS_STUB_FAILURE_RATE", "0")),
+        )
+    else:
+        backend = GeminiBackend(
+            os.getenv("ATS_MODEL_NAME", MODEL_NAME),
+            os.getenv("ATS_CONTEXT_MODEL", CONTEXT_MODEL_NAME),
+        )
+    hedge_after = os.getenv("ATS_MODEL_HEDGE_AFTER")
+    return ModelClient(
+        backend,
+        retries=int(os.getenv("ATS_MODEL_RETRIES", "3")),
+        backoff=float(os.getenv("ATS_MODEL_BACKOFF", "0.5")),
+        max_backoff=float(os.getenv("ATS_MODEL_MAX_BACKOFF", "8")),
+        hedge_percentile=float(os.getenv("ATS_MODEL_HEDGE_PERCENTILE", "0")),
+        hedge_after=float(hedge_after) if hedge_after else None,
+        context_ttl=float(os.getenv("ATS_CONTEXT_CACHE_TTL", "0")),
+        scheduler=get_scheduler(),
+    )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide model client, creating and warming it up on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = client_from_env()
+            _client.warm_up()
+    return _client
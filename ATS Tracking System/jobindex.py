@@ -0,0 +1,264 @@
+"""
+Persistent job-description index for matching one resume against many openings.
+
+Term statistics live in append-only binary files that are memory-mapped with
+NumPy, so the index opens instantly and scoring a resume is a handful of
+vectorized operations over all postings. Jobs can be added and removed
+incrementally; removed jobs are tombstoned until `compact()` rewrites the files.
+
+Usage:
+    python jobindex.py --index jobs.idx add jobs/            # one .txt file per job
+    python jobindex.py --index jobs.idx remove job-123
+    python jobindex.py --index jobs.idx search resume.pdf --k 20 [--analysis "Percentage Match"]
+"""
+import os
+import sys
+import json
+import zlib
+import argparse
+import numpy as np
+
+from scorer import terms
+
+HASH_BITS = 20
+HASH_SIZE = 1 << HASH_BITS
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Append-only postings and per-job arrays: file name -> dtype
+ARRAYS = {
+    "post_term": np.int32,
+    "post_tf": np.float32,
+    "post_doc": np.int32,
+    "doc_len": np.float32,
+    "alive": np.uint8,
+}
+
+
+def term_id(term):
+    """
+    Stable hashed id of a term (Python's hash() is salted per process).
+    """
+    return zlib.crc32(term.encode()) & (HASH_SIZE - 1)
+
+
+def term_counts(text):
+    """
+    Return (hashed term ids, counts, total terms) for a text.
+    """
+    ids = np.fromiter((term_id(t) for t in terms(text)), dtype=np.int32)
+    unique, counts = np.unique(ids, return_counts=True)
+    return unique, counts.astype(np.float32), float(len(ids))
+
+
+class JobIndex:
+    """
+    Memory-mapped BM25 index over job descriptions.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        meta_path = self._path("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        else:
+            meta = {"rows": [], "titles": []}
+        self.rows = meta["rows"]
+        self.titles = meta["titles"]
+        self.row_of = {job_id: row for row, job_id in enumerate(self.rows) if job_id is not None}
+
+        df_path = self._path("df.npy")
+        if not os.path.exists(df_path):
+            np.lib.format.open_memmap(df_path, mode="w+", dtype=np.int32, shape=(HASH_SIZE,)).flush()
+        self.df = np.lib.format.open_memmap(df_path, mode="r+")
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _array(self, name, mode="r"):
+        path = self._path(name + ".bin")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=ARRAYS[name])
+        return np.memmap(path, dtype=ARRAYS[name], mode=mode)
+
+    def _append(self, name, values):
+        with open(self._path(name + ".bin"), "ab") as f:
+            f.write(np.ascontiguousarray(values, dtype=ARRAYS[name]).tobytes())
+
+    def _save_meta(self):
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"rows": self.rows, "titles": self.titles}, f)
+        os.replace(tmp_path, self._path("meta.json"))
+        self.df.flush()
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def __contains__(self, job_id):
+        return job_id in self.row_of
+
+    def add_many(self, jobs):
+        """
+        Add or replace jobs given as (job_id, text, title) tuples.
+        """
+        for job_id, text, title in jobs:
+            if job_id in self.row_of:
+                self._remove(job_id)
+            ids, counts, length = term_counts(text)
+            row = len(self.rows)
+            self._append("post_term", ids)
+            self._append("post_tf", counts)
+            self._append("post_doc", np.full(len(ids), row))
+            self._append("doc_len", [length])
+            self._append("alive", [1])
+            self.df[ids] += 1
+            self.rows.append(job_id)
+            self.titles.append(title)
+            self.row_of[job_id] = row
+            with open(self._path("texts.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"row": row, "text": text}, ensure_ascii=False) + "\n")
+        self._save_meta()
+
+    def add(self, job_id, text, title=None):
+        self.add_many([(job_id, text, title)])
+
+    def _remove(self, job_id):
+        row = self.row_of.pop(job_id)
+        alive = self._array("alive", mode="r+")
+        alive[row] = 0
+        alive.flush()
+        post_doc = self._array("post_doc")
+        post_term = self._array("post_term")
+        self.df[post_term[post_doc == row]] -= 1
+        self.rows[row] = None
+
+    def remove(self, job_id):
+        """
+        Remove a job. Its postings stay on disk until compact().
+        """
+        if job_id not in self.row_of:
+            raise KeyError(job_id)
+        self._remove(job_id)
+        self._save_meta()
+
+    def search(self, resume_text, k=20):
+        """
+        Return the top-k (job_id, title, score) matches for a resume, best first.
+        """
+        if not self.row_of:
+            return []
+        query_ids, _, _ = term_counts(resume_text)
+        query = np.zeros(HASH_SIZE, dtype=bool)
+        query[query_ids] = True
+
+        post_term = self._array("post_term")
+        post_doc = self._array("post_doc")
+        post_tf = self._array("post_tf")
+        doc_len = self._array("doc_len")
+        alive = self._array("alive").astype(bool)
+
+        # Only postings for terms that occur in the resume contribute
+        hit = query[post_term]
+        if not hit.any():
+            return []
+        terms_hit, docs_hit, tf = post_term[hit], post_doc[hit], post_tf[hit]
+
+        n_docs = len(self.row_of)
+        df = self.df[terms_hit]
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+        avg_len = doc_len[alive].mean() or 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len[docs_hit] / avg_len)
+        scores = np.bincount(docs_hit, weights=idf * tf * (BM25_K1 + 1) / (tf + norm), minlength=len(doc_len)).astype(float)
+        scores[~alive] = -np.inf
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.rows[row], self.titles[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    def texts(self, job_ids):
+        """
+        Return {job_id: text} for the given live jobs.
+        """
+        wanted = {self.row_of[job_id]: job_id for job_id in job_ids if job_id in self.row_of}
+        found = {}
+        with open(self._path("texts.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["row"] in wanted:
+                    found[wanted[entry["row"]]] = entry["text"]
+        return found
+
+    def compact(self):
+        """
+        Rewrite the index without removed jobs.
+        """
+        live = [(job_id, text, self.titles[self.row_of[job_id]])
+                for job_id, text in self.texts(list(self.row_of)).items()]
+        for name in list(ARRAYS) + ["texts"]:
+            path = self._path(name + (".jsonl" if name == "texts" else ".bin"))
+            if os.path.exists(path):
+                os.remove(path)
+        self.df[:] = 0
+        self.rows, self.titles, self.row_of = [], [], {}
+        self.add_many(live)
+
+
+def main():
+    """
+    Command-line interface for building and querying the index.
+    """
+    parser = argparse.ArgumentParser(description="Index job descriptions and find the best openings for a resume.")
+    parser.add_argument("--index", required=True, help="Index directory.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser("add", help="Add every .txt file in a directory (job id = file name).")
+    add_parser.add_argument("directory")
+    remove_parser = commands.add_parser("remove", help="Remove jobs by id.")
+    remove_parser.add_argument("job_ids", nargs="+")
+    commands.add_parser("compact", help="Drop removed jobs from disk.")
+    search_parser = commands.add_parser("search", help="Find the best jobs for a resume PDF.")
+    search_parser.add_argument("resume")
+    search_parser.add_argument("--k", type=int, default=20)
+    search_parser.add_argument("--analysis", help="Run this analysis with the model on the shortlisted jobs only.")
+    args = parser.parse_args()
+
+    index = JobIndex(args.index)
+    if args.command == "add":
+        jobs = []
+        for name in sorted(os.listdir(args.directory)):
+            if name.endswith(".txt"):
+                with open(os.path.join(args.directory, name), encoding="utf-8") as f:
+                    text = f.read()
+                jobs.append((name[:-4], text, text.strip().split("\n", 1)[0][:120]))
+        index.add_many(jobs)
+        print("Indexed %d jobs (%d total)" % (len(jobs), len(index)))
+    elif args.command == "remove":
+        for job_id in args.job_ids:
+            index.remove(job_id)
+        print("%d jobs remain" % len(index))
+    elif args.command == "compact":
+        index.compact()
+        print("Compacted index with %d jobs" % len(index))
+    else:
+        from app import get_gemini_response, prepare_resume, resume_text
+        from prompts import PROMPTS
+        with open(args.resume, "rb") as f:
+            text = resume_text(f)
+            if not text.strip():
+                sys.exit("The resume has no text layer to match on")
+            matches = index.search(text, args.k)
+            for rank, (job_id, title, score) in enumerate(matches, start=1):
+                print("%2d. %-30s %7.2f  %s" % (rank, job_id, score, title or ""))
+            if args.analysis:
+                pdf_parts = prepare_resume(f)
+                texts = index.texts([job_id for job_id, _, _ in matches])
+                for job_id, _, _ in matches:
+                    print("\n=== %s ===" % job_id)
+                    print(get_gemini_response(texts[job_id], pdf_parts, PROMPTS[args.analysis]))
+
+
+if __name__ == "__main__":
+    main()
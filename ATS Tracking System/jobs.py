@@ -0,0 +1,144 @@
+"""
+Process-wide background job queue with in-flight deduplication.
+
+Analyses run on a shared worker pool instead of the Streamlit script thread,
+so reruns and repeated clicks do not repeat or block the work. Jobs are
+identified by an id the page keeps in st.session_state; submitting a job
+whose key matches one still in flight returns the existing job (single-flight).
+"""
+import os
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import metrics
+
+# Finished jobs are kept this long (seconds) for pages that poll late
+DEFAULT_JOB_TTL = 15 * 60
+
+
+class Job:
+    """
+    One unit of background work. Workers append partial output to `chunks`.
+    """
+
+    def __init__(self, job_id, key):
+        self.id = job_id
+        self.key = key
+        self.status = "pending"
+        self.chunks = []
+        self.result = None
+        self.error = None
+        self.timings = {}
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    @property
+    def text(self):
+        """
+        The full result once done, otherwise the output received so far.
+        """
+        if self.result is not None:
+            return self.result
+        return "".join(self.chunks)
+
+
+class JobQueue:
+    """
+    Runs jobs on a thread pool, coalescing identical in-flight submissions.
+    """
+
+    def __init__(self, workers=8, ttl=DEFAULT_JOB_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args):
+        """
+        Run fn(job, *args) in the background and return the job id.
+        If a job with the same key is still running, its id is returned instead.
+        """
+        with self._lock:
+            self._expire()
+            job = self._inflight.get(key)
+            if job is not None:
+                metrics.count("ats_jobs_coalesced_total")
+                return job.id
+            job = Job(uuid.uuid4().hex, key)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+        self._executor.submit(contextvars.copy_context().run, self._run, job, fn, args)
+        return job.id
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        try:
+            job.result = fn(job, *args)
+            job.status = "done"
+        except Exception as e:
+            job.error = e
+            job.status = "error"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                if self._inflight.get(job.key) is job:
+                    del self._inflight[job.key]
+            job.done.set()
+
+    def get(self, job_id):
+        """
+        Return the job with this id, or None if it is unknown or expired.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+
+_queue = None
+_queue_lock = threading.Lock()
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+@contextmanager
+def key_lock(key):
+    """
+    Hold a process-wide lock for `key`, so concurrent callers for the same key run one at a time.
+    Lives here rather than in app.py because Streamlit re-executes app.py on every rerun.
+    """
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+def get_job_queue():
+    """
+    Return the process-wide job queue (sized by ATS_JOB_WORKERS).
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                workers=int(os.getenv("ATS_JOB_WORKERS", "8")),
+                ttl=float(os.getenv("ATS_JOB_TTL", DEFAULT_JOB_TTL)),
+            )
+    return _queue
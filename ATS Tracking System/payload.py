@@ -0,0 +1,97 @@
+"""
+Size-bounded image payloads for the model.
+
+Pages are JPEG-encoded into a reused buffer and handed to the SDK as raw bytes
+(no base64 copy). Quality, then resolution, is lowered until each page fits the
+target byte size.
+"""
+import io
+import os
+import json
+import struct
+
+DEFAULT_TARGET_BYTES = int(os.getenv("ATS_JPEG_TARGET_BYTES", "300000"))
+QUALITY_STEPS = (85, 75, 65, 55, 45)
+MIN_SIDE = 400
+
+_MAGIC = b"ATSP"
+
+
+def encode_jpeg(image, target_bytes=DEFAULT_TARGET_BYTES, buffer=None):
+    """
+    Encode a PIL image as JPEG bytes no larger than `target_bytes` where possible.
+    Tries decreasing quality first, then scales the image down and tries again.
+    """
+    buffer = buffer or io.BytesIO()
+    while True:
+        for quality in QUALITY_STEPS:
+            buffer.seek(0)
+            buffer.truncate()
+            image.save(buffer, format="JPEG", quality=quality, optimize=True)
+            if not target_bytes or buffer.tell() <= target_bytes:
+                return buffer.getvalue()
+        # Smallest quality still too large: shrink by the overshoot ratio and retry
+        scale = max((target_bytes / buffer.tell()) ** 0.5, 0.5)
+        width, height = int(image.width * scale), int(image.height * scale)
+        if min(width, height) < MIN_SIDE:
+            return buffer.getvalue()
+        image = image.resize((width, height))
+
+
+def image_parts(images, target_bytes=DEFAULT_TARGET_BYTES):
+    """
+    Encode rendered pages as raw-bytes JPEG content parts, sharing one encode buffer.
+    """
+    buffer = io.BytesIO()
+    return [
+        {"mime_type": "image/jpeg", "data": encode_jpeg(image, target_bytes, buffer)}
+        for image in images
+    ]
+
+
+def payload_size(pdf_parts):
+    """
+    Total size in bytes of the content parts sent with each request.
+    """
+    total = 0
+    for part in pdf_parts:
+        if isinstance(part, dict):
+            total += len(part["data"])
+        else:
+            total += len(part.encode())
+    return total
+
+
+def pack_parts(pdf_parts):
+    """
+    Serialize content parts to bytes for the render cache: a JSON header followed by raw blobs.
+    """
+    header = []
+    blobs = []
+    for part in pdf_parts:
+        if isinstance(part, dict):
+            header.append({"mime_type": part["mime_type"], "length": len(part["data"])})
+            blobs.append(part["data"])
+        else:
+            header.append({"text": part})
+    header_bytes = json.dumps(header).encode()
+    return b"".join([_MAGIC, struct.pack(">I", len(header_bytes)), header_bytes] + blobs)
+
+
+def unpack_parts(data):
+    """
+    Inverse of pack_parts. Blob parts are returned as bytes.
+    """
+    if data[:4] != _MAGIC:
+        raise ValueError("Not a packed payload")
+    view = memoryview(data)
+    (header_length,) = struct.unpack(">I", view[4:8])
+    offset = 8 + header_length
+    pdf_parts = []
+    for entry in json.loads(bytes(view[8:offset])):
+        if "text" in entry:
+            pdf_parts.append(entry["text"])
+        else:
+            pdf_parts.append({"mime_type": entry["mime_type"], "data": bytes(view[offset:offset + entry["length"]])})
+            offset += entry["length"]
+    return pdf_parts
@@ -0,0 +1,47 @@
+"""
+Prompt registry: the analysis types offered in the app, loaded and validated
+once per process from prompts.json (or the file named by ATS_PROMPTS_FILE).
+"""
+import os
+import json
+
+DEFAULT_PROMPTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts.json")
+
+
+def load_prompts(path=None):
+    """
+    Load the analysis-name -> prompt table, raising ValueError if it is malformed.
+    """
+    path = path or os.getenv("ATS_PROMPTS_FILE", DEFAULT_PROMPTS_FILE)
+    with open(path, encoding="utf-8") as f:
+        prompts = json.load(f)
+    if not isinstance(prompts, dict) or not prompts:
+        raise ValueError("%s must contain a non-empty JSON object" % path)
+    for name, prompt in prompts.items():
+        if not name.strip() or not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError("%s: analysis %r needs a non-empty prompt" % (path, name))
+    return prompts
+
+
+# Loaded at first import; Streamlit reruns reuse the imported module
+PROMPTS = load_prompts()
+_ANALYSIS_BY_PROMPT = {prompt: name for name, prompt in PROMPTS.items()}
+
+
+# One-time resume distillation (see "Keypoints in my Resume" in imtnotes); not an analysis type
+DISTILL_PROMPT = (
+    "Extract technical skills, soft skills, education details, and experience/project information "
+    "directly from the resume. Only include information explicitly stated in the resume for each category.\n"
+    "Write a compact plain-text profile, at most about 400 words, with these sections in this order: "
+    "Headline (current title, years of experience, location if stated); Technical Skills; Soft Skills; "
+    "Education; Experience (one line per role: title, organization, dates, key achievements with numbers); "
+    "Projects; Certifications; Languages. Use short comma-separated lists, omit empty sections, "
+    "and do not add commentary or formatting beyond the section names."
+)
+
+
+def analysis_name(prompt):
+    """
+    Return the analysis type for a prompt from the registry, or "custom".
+    """
+    return _ANALYSIS_BY_PROMPT.get(prompt, "custom")
@@ -0,0 +1,320 @@
+"""
+Cross-process quota scheduler for model calls.
+
+Every process on the host (Streamlit sessions, API workers, batch runs) shares
+one SQLite database holding:
+    - token buckets for requests per minute and tokens per minute,
+    - the queue of waiting calls, served by priority (interactive before batch)
+      and then in arrival order,
+    - the calls in flight, capped by a concurrency limit that adapts to
+      observed latency and errors (additive increase, multiplicative decrease).
+
+Calls wait their turn instead of all failing with quota errors at the ceiling.
+
+Configuration (environment):
+    ATS_QUOTA_RPM               requests per minute (default 0 = scheduler off)
+    ATS_QUOTA_TPM               tokens per minute (default 0 = unlimited)
+    ATS_QUOTA_BURST             seconds of quota that may be spent at once (default 10)
+    ATS_QUOTA_MAX_CONCURRENCY   upper bound for the adaptive concurrency limit (default 16)
+    ATS_QUOTA_TIMEOUT           longest a call may wait for a slot, in seconds (default 120)
+    ATS_QUOTA_DB                database path (default .ats_cache/quota.sqlite)
+"""
+import os
+import time
+import uuid
+import sqlite3
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from cache import DEFAULT_CACHE_DIR
+from tracing import current_span, span
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Tokens assumed for the reply when the call sets no output budget; corrected after the call
+DEFAULT_OUTPUT_ESTIMATE = 1024
+# Approximate input tokens the model charges per image part
+IMAGE_TOKENS = 258
+
+POLL_INTERVAL = 0.05
+# Waiters that stop polling (crashed process) are dropped after this many seconds
+WAITER_TIMEOUT = 10.0
+# Leases of calls that never reported back are reclaimed after this many seconds
+LEASE_TIMEOUT = 600.0
+
+_priority = contextvars.ContextVar("ats_quota_priority", default=None)
+_default_priority = INTERACTIVE
+
+
+class QuotaTimeout(Exception):
+    """
+    A call waited longer than the scheduler's timeout for quota.
+    Not a TimeoutError, so the model client does not retry (and wait all over again).
+    """
+
+
+def set_default_priority(priority):
+    """
+    Set the priority used by this process's calls (e.g. BATCH for batch runs).
+    """
+    global _default_priority
+    _default_priority = priority
+
+
+@contextmanager
+def priority(level):
+    """
+    Run the calls made inside the block at the given priority.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    level = _priority.get()
+    return _default_priority if level is None else level
+
+
+def estimate_input_tokens(contents):
+    """
+    Estimate the input tokens of `contents`: ~4 characters per text token, a fixed cost per image.
+    """
+    return sum(len(part) // 4 if isinstance(part, str) else IMAGE_TOKENS for part in contents)
+
+
+def estimate_tokens(contents, config=None):
+    """
+    Estimate the tokens a call will use: its input plus the output budget.
+    """
+    output_tokens = (config or {}).get("max_output_tokens") or DEFAULT_OUTPUT_ESTIMATE
+    return estimate_input_tokens(contents) + output_tokens
+
+
+def _span_tokens():
+    active = current_span()
+    if active is None:
+        return None
+    return active.fields.get("input_tokens", 0) + active.fields.get("output_tokens", 0)
+
+
+class QuotaScheduler:
+    """
+    RPM/TPM token buckets, a priority queue and an adaptive concurrency limit shared through SQLite.
+    """
+
+    def __init__(self, path, rpm, tpm=0, burst=10.0, max_concurrency=16, timeout=120.0):
+        self.path = path
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.request_capacity = max(rpm * burst / 60.0, 1.0)
+        self.token_capacity = tpm * burst / 60.0
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS waiters ("
+                "id TEXT PRIMARY KEY, priority INTEGER NOT NULL, enqueued REAL NOT NULL, heartbeat REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (id TEXT PRIMARY KEY, tokens REAL NOT NULL, started REAL NOT NULL)")
+            now = time.time()
+            for name, value in (("requests", self.request_capacity), ("tokens", self.token_capacity),
+                                ("refilled", now), ("limit", float(max_concurrency)), ("latency", 0.0)):
+                conn.execute("INSERT OR IGNORE INTO state (name, value) VALUES (?, ?)", (name, value))
+
+    def _connection(self):
+        # One connection per thread; SQLite connections are not shared across threads here
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, serializing schedulers across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _state(self, conn):
+        return dict(conn.execute("SELECT name, value FROM state").fetchall())
+
+    def _refill(self, conn, now):
+        state = self._state(conn)
+        elapsed = max(now - state["refilled"], 0.0)
+        state["requests"] = min(self.request_capacity, state["requests"] + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            state["tokens"] = min(self.token_capacity, state["tokens"] + elapsed * self.tpm / 60.0)
+        state["refilled"] = now
+        return state
+
+    def _save(self, conn, state, *names):
+        conn.executemany("UPDATE state SET value = ? WHERE name = ?", [(state[name], name) for name in names])
+
+    def _try_acquire(self, waiter_id, level, enqueued, tokens):
+        """
+        Return (lease id, None) if the call may start now, else (None, seconds to wait).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # Refresh our own heartbeat first: a long wait for the write lock must not get us reaped
+            updated = conn.execute("UPDATE waiters SET heartbeat = ? WHERE id = ?", (now, waiter_id)).rowcount
+            if not updated:
+                conn.execute("INSERT INTO waiters (id, priority, enqueued, heartbeat) VALUES (?, ?, ?, ?)",
+                             (waiter_id, level, enqueued, now))
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - WAITER_TIMEOUT,))
+            conn.execute("DELETE FROM leases WHERE started < ?", (now - LEASE_TIMEOUT,))
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM waiters WHERE priority < ? OR (priority = ? AND enqueued < ?)",
+                (level, level, enqueued),
+            ).fetchone()[0]
+            if ahead:
+                return None, POLL_INTERVAL
+
+            state = self._refill(conn, now)
+            self._save(conn, state, "requests", "tokens", "refilled")
+            inflight = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+            if inflight >= int(state["limit"]):
+                return None, POLL_INTERVAL
+            # A single call larger than the bucket only needs a full bucket, or it would never start
+            needed = min(tokens, self.token_capacity)
+            waits = []
+            if state["requests"] < 1:
+                waits.append((1 - state["requests"]) * 60.0 / self.rpm)
+            if self.tpm and state["tokens"] < needed:
+                waits.append((needed - state["tokens"]) * 60.0 / self.tpm)
+            if waits:
+                return None, max(waits)
+
+            state["requests"] -= 1
+            if self.tpm:
+                state["tokens"] -= tokens
+            self._save(conn, state, "requests", "tokens")
+            lease_id = uuid.uuid4().hex
+            conn.execute("INSERT INTO leases (id, tokens, started) VALUES (?, ?, ?)", (lease_id, tokens, now))
+            conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            return lease_id, None
+
+    def acquire(self, tokens, level=None):
+        """
+        Block until a call estimated at `tokens` may start; return its lease id.
+        Raises QuotaTimeout after `timeout` seconds.
+        """
+        level = current_priority() if level is None else level
+        waiter_id = uuid.uuid4().hex
+        now = time.time()
+        deadline = time.monotonic() + self.timeout
+        with span("quota_wait", priority=PRIORITY_NAMES.get(level, level)) as stage:
+            with self._transaction() as conn:
+                conn.execute("INSERT INTO waiters (id, priority, enqueued, heartbeat) VALUES (?, ?, ?, ?)",
+                             (waiter_id, level, now, now))
+            try:
+                while True:
+                    lease_id, wait = self._try_acquire(waiter_id, level, now, tokens)
+                    if lease_id is not None:
+                        return lease_id
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        stage.set(timed_out=True)
+                        raise QuotaTimeout("No model quota available within %.0fs" % self.timeout)
+                    # Poll at least this often so priorities and freed slots are noticed promptly
+                    time.sleep(min(wait, POLL_INTERVAL * 4, remaining))
+            except BaseException:
+                with self._transaction() as conn:
+                    conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+                raise
+
+    def release(self, lease_id, latency, congested=False, tokens=None):
+        """
+        End a call: return unused estimated tokens and adapt the concurrency limit.
+        `congested` marks a quota/overload error; `tokens` is the actual usage if known.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT tokens FROM leases WHERE id = ?", (lease_id,)).fetchone()
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+            state = self._refill(conn, now)
+            if row is not None and tokens is not None and self.tpm:
+                state["tokens"] = min(self.token_capacity, state["tokens"] + row[0] - tokens)
+
+            limit, average = state["limit"], state["latency"]
+            if congested:
+                limit = limit / 2
+            elif average and latency > 2 * average:
+                # Queueing at the provider shows up as latency before it shows up as errors
+                limit = limit * 0.9
+            else:
+                limit = limit + 1 / limit
+            state["limit"] = min(max(limit, 1.0), float(self.max_concurrency))
+            if not congested:
+                state["latency"] = latency if not average else average * 0.9 + latency * 0.1
+            self._save(conn, state, "requests", "tokens", "refilled", "limit", "latency")
+
+    @contextmanager
+    def slot(self, tokens, is_congestion=None):
+        """
+        Hold a scheduler slot for one model call. Exceptions for which `is_congestion`
+        returns True shrink the concurrency limit.
+        """
+        lease_id = self.acquire(tokens)
+        before = _span_tokens()
+        start = time.perf_counter()
+        congested = False
+        try:
+            yield
+        except Exception as e:
+            congested = bool(is_congestion and is_congestion(e))
+            raise
+        finally:
+            after = _span_tokens()
+            used = after - before if before is not None and after is not None and after > before else None
+            self.release(lease_id, time.perf_counter() - start, congested, used)
+
+    def stats(self):
+        with self._transaction() as conn:
+            state = self._state(conn)
+            state["inflight"] = conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]
+            state["waiting"] = conn.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]
+        return state
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Return the process-wide scheduler, or None when ATS_QUOTA_RPM is unset.
+    """
+    global _scheduler
+    rpm = float(os.getenv("ATS_QUOTA_RPM", "0"))
+    if not rpm:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = QuotaScheduler(
+                os.getenv("ATS_QUOTA_DB", os.path.join(os.getenv("ATS_CACHE_DIR", DEFAULT_CACHE_DIR), "quota.sqlite")),
+                rpm=rpm,
+                tpm=float(os.getenv("ATS_QUOTA_TPM", "0")),
+                burst=float(os.getenv("ATS_QUOTA_BURST", "10")),
+                max_concurrency=int(os.getenv("ATS_QUOTA_MAX_CONCURRENCY", "16")),
+                timeout=float(os.getenv("ATS_QUOTA_TIMEOUT", "120")),
+            )
+    return _scheduler
@@ -0,0 +1,127 @@
+"""
+Resume rasterization engine: page selection, DPI/colour profiles, parallel
+rendering and a total pixel budget across all pages.
+
+Run `python render.py resume.pdf` to compare it against rendering every page
+at the default settings.
+"""
+import os
+import sys
+import math
+import time
+
+# Named DPI/colour profiles
+RENDER_PROFILES = {
+    "default": {"dpi": 200, "grayscale": False},
+    "text": {"dpi": 120, "grayscale": True},
+    "high": {"dpi": 300, "grayscale": False},
+}
+
+POINTS_PER_INCH = 72.0
+
+
+def pdf_info(pdf_bytes):
+    """
+    Return the page count and first-page size in points of a PDF.
+    """
+    import pdf2image
+
+    info = pdf2image.pdfinfo_from_bytes(pdf_bytes)
+    width, height = 612.0, 792.0  # US Letter, if poppler does not report a size
+    size = info.get("Page size", "")
+    parts = size.split()
+    if len(parts) >= 3 and parts[1] == "x":
+        try:
+            width, height = float(parts[0]), float(parts[2])
+        except ValueError:
+            pass
+    return int(info["Pages"]), width, height
+
+
+def budget_dpi(dpi, page_count, width_pt, height_pt, max_pixels):
+    """
+    Lower the DPI so that `page_count` pages of the given size fit in `max_pixels`.
+    """
+    if not max_pixels:
+        return dpi
+    pixels_per_page = (width_pt / POINTS_PER_INCH * dpi) * (height_pt / POINTS_PER_INCH * dpi)
+    total = pixels_per_page * page_count
+    if total <= max_pixels:
+        return dpi
+    return max(int(dpi * math.sqrt(max_pixels / total)), 36)
+
+
+def fit_pixel_budget(images, max_pixels):
+    """
+    Downscale images proportionally if their combined pixel count exceeds `max_pixels`.
+    """
+    total = sum(image.width * image.height for image in images)
+    if not max_pixels or total <= max_pixels:
+        return images
+    scale = math.sqrt(max_pixels / total)
+    return [
+        image.resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)))
+        for image in images
+    ]
+
+
+def render_pages(pdf_bytes, first_page=1, last_page=None, profile="default", max_pixels=None, workers=None):
+    """
+    Render a page range of a PDF using a named profile.
+    Pages are split across `workers` pdftoppm processes (defaults to the CPU count).
+    """
+    import pdf2image
+
+    settings = RENDER_PROFILES[profile]
+    page_count, width, height = pdf_info(pdf_bytes)
+    first_page = max(first_page, 1)
+    last_page = min(last_page or page_count, page_count)
+    if last_page < first_page:
+        raise ValueError("Page range %d-%d is outside the document (%d pages)" % (first_page, last_page, page_count))
+    selected = last_page - first_page + 1
+
+    dpi = budget_dpi(settings["dpi"], selected, width, height, max_pixels)
+    images = pdf2image.convert_from_bytes(
+        pdf_bytes,
+        dpi=dpi,
+        first_page=first_page,
+        last_page=last_page,
+        grayscale=settings["grayscale"],
+        thread_count=min(workers or os.cpu_count() or 1, selected),
+    )
+    # Pages larger than the first one can still overshoot the estimate
+    return fit_pixel_budget(images, max_pixels)
+
+
+def benchmark(pdf_bytes, runs=3, **render_kwargs):
+    """
+    Time the legacy render-everything path against render_pages. Returns best-of-`runs` seconds.
+    """
+    import pdf2image
+
+    def best(fn):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    legacy = best(lambda: pdf2image.convert_from_bytes(pdf_bytes)[0])
+    engine = best(lambda: render_pages(pdf_bytes, **render_kwargs))
+    return {"legacy": legacy, "engine": engine, "speedup": legacy / engine if engine else float("inf")}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python render.py resume.pdf [profile] [last_page]")
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+    profile = sys.argv[2] if len(sys.argv) > 2 else "default"
+    last_page = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    pages = pdf_info(data)[0]
+    print("%s: %d pages, profile=%s, pages 1-%d" % (sys.argv[1], pages, profile, min(last_page, pages)))
+    result = benchmark(data, profile=profile, last_page=last_page, max_pixels=8_000_000)
+    print("render all pages (legacy): %.3fs" % result["legacy"])
+    print("render_pages:              %.3fs" % result["engine"])
+    print("speedup:                   %.1fx" % result["speedup"])
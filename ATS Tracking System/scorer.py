@@ -0,0 +1,192 @@
+"""
+Local, deterministic ATS scoring for "Percentage Match" and "Keywords Missing".
+
+The job description is split into requirements (lines/sentences). Terms
+(unigrams and bigrams) are weighted with BM25-style IDF computed over the
+requirement and resume sentences, and the match is the weighted share of job
+description terms found in the resume.
+"""
+import re
+import numpy as np
+
+STOPWORDS = frozenset("""
+a about above across after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each either etc few for from further
+had has have having he her here hers him his how i if in into is it its itself just least less let like
+may me might more most must my no nor not of off on once only or other our ours out over own per please
+same shall she should so some such than that the their theirs them then there these they this those
+through to too under until up upon us very via was we well were what when where whether which while who
+whom why will with within without would yet you your yours
+ability able candidate candidates experience experienced including job knowledge looking preferred
+required requirement requirements responsibilities role strong team work working years year plus skills
+skill good excellent understanding using use new familiarity familiar proven solid great
+""".split())
+
+# Words that end in "s" but are not plurals
+NO_STEM = frozenset("""
+analytics devops economics ethics graphics jenkins kubernetes logistics mathematics news pandas physics
+robotics sales statistics windows
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[.\-/][a-z0-9+#]+)*")
+SPLIT_RE = re.compile(r"[\n\r•●▪;]+|(?<=[.!?])\s+")
+
+BM25_K1 = 1.2
+
+
+def normalize(token):
+    """
+    Light normalization: strip a plural "s" from longer alphabetic tokens.
+    """
+    if (len(token) > 4 and token.isalpha() and token.endswith("s")
+            and not token.endswith(("ss", "us", "is")) and token not in NO_STEM):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """
+    Lowercase, tokenize and drop stopwords. Tokens keep characters like + and # (c++, c#, node.js).
+    """
+    return [t for t in _tokens(text) if t is not None]
+
+
+def _tokens(text):
+    # Normalized tokens in order, with None in place of stopwords and between tokens separated
+    # by punctuation (commas, colons, parentheses) so phrases do not span them
+    tokens = []
+    end = 0
+    for match in TOKEN_RE.finditer(text.lower()):
+        if tokens and match.string[end:match.start()].strip():
+            tokens.append(None)
+        end = match.end()
+        t = match.group()
+        tokens.append(None if t in STOPWORDS or not any(c.isalpha() for c in t) else normalize(t))
+    return tokens
+
+
+def terms(text):
+    """
+    Unigrams plus bigrams of adjacent, non-stopword tokens.
+    """
+    tokens = _tokens(text)
+    bigrams = [a + " " + b for a, b in zip(tokens, tokens[1:]) if a is not None and b is not None]
+    return [t for t in tokens if t is not None] + bigrams
+
+
+def split_requirements(text):
+    """
+    Split text into lines or sentences, dropping those without any terms.
+    Single-term lines are kept: JDs often list one skill per bullet.
+    """
+    return [chunk.strip(" -*\t") for chunk in SPLIT_RE.split(text) if tokenize(chunk)]
+
+
+def score_resume(job_description, resume_text, top_n=25):
+    """
+    Score a resume against a job description.
+    Returns a dict with the match percentage, TF-IDF cosine similarity,
+    ranked missing keywords and per-requirement coverage.
+    """
+    requirements = split_requirements(job_description) or [job_description]
+    resume_sentences = split_requirements(resume_text) or [resume_text]
+
+    jd_docs = [terms(r) for r in requirements]
+    resume_docs = [terms(s) for s in resume_sentences]
+    vocab = {}
+    for doc in jd_docs:
+        for term in doc:
+            vocab.setdefault(term, len(vocab))
+    if not vocab:
+        return {"match": 0.0, "similarity": 0.0, "missing": [], "requirements": []}
+
+    # Term-frequency matrices over the job description vocabulary
+    jd_tf = np.zeros((len(jd_docs), len(vocab)))
+    for row, doc in enumerate(jd_docs):
+        for term in doc:
+            jd_tf[row, vocab[term]] += 1
+    resume_tf = np.zeros(len(vocab))
+    resume_df = np.zeros(len(vocab))
+    for doc in resume_docs:
+        seen = set()
+        for term in doc:
+            index = vocab.get(term)
+            if index is not None:
+                resume_tf[index] += 1
+                seen.add(index)
+        resume_df[list(seen)] += 1
+
+    # BM25 IDF over requirement and resume sentences
+    n_docs = len(jd_docs) + len(resume_docs)
+    df = (jd_tf > 0).sum(axis=0) + resume_df
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+    jd_counts = jd_tf.sum(axis=0)
+    jd_weights = idf * jd_counts * (BM25_K1 + 1) / (jd_counts + BM25_K1)
+    # Bigrams count half so that a phrase does not outweigh its own words
+    is_bigram = np.array([" " in term for term in vocab])
+    jd_weights[is_bigram] *= 0.5
+
+    present = resume_tf > 0
+    match = float(jd_weights[present].sum() / jd_weights.sum() * 100)
+
+    resume_weights = idf * resume_tf * (BM25_K1 + 1) / (resume_tf + BM25_K1)
+    denominator = np.linalg.norm(jd_weights) * np.linalg.norm(resume_weights)
+    similarity = float(jd_weights @ resume_weights / denominator) if denominator else 0.0
+
+    # Per-requirement coverage: weighted share of each requirement's terms present in the resume
+    requirement_weights = (jd_tf > 0) * jd_weights
+    totals = requirement_weights.sum(axis=1)
+    covered = (requirement_weights * present).sum(axis=1)
+    coverage = np.divide(covered, totals, out=np.zeros_like(covered), where=totals > 0)
+
+    terms_by_index = list(vocab)
+    missing_weights = {
+        terms_by_index[i]: float(jd_weights[i])
+        for i in np.flatnonzero(~present & (jd_weights > 0))
+    }
+    return {
+        "match": round(match, 1),
+        "similarity": round(similarity, 3),
+        "missing": rank_missing(missing_weights)[:top_n],
+        "requirements": [(text, round(float(c) * 100, 1)) for text, c in zip(requirements, coverage)],
+    }
+
+
+def rank_missing(missing_weights):
+    """
+    Rank missing terms by weight. A missing phrase absorbs its missing words,
+    so "machine learning" is listed once rather than alongside "machine" and "learning".
+    """
+    ranked = dict(missing_weights)
+    for term in sorted(missing_weights, key=missing_weights.get, reverse=True):
+        if " " not in term:
+            continue
+        words = set(term.split(" "))
+        if all(word in ranked for word in words):
+            ranked[term] += sum(ranked.pop(word) for word in words)
+    return [
+        (term, round(weight, 3))
+        for term, weight in sorted(ranked.items(), key=lambda item: item[1], reverse=True)
+    ]
+
+
+def format_score(result, analysis):
+    """
+    Render a score as Markdown for the "Percentage Match" or "Keywords Missing" view.
+    """
+    lines = []
+    if analysis == "Percentage Match":
+        lines.append("**Match: %.1f%%** (TF-IDF similarity %.2f)" % (result["match"], result["similarity"]))
+        lines.append("")
+        lines.append("| Requirement | Coverage |")
+        lines.append("| --- | --- |")
+        for text, coverage in result["requirements"]:
+            lines.append("| %s | %.0f%% |" % (text.replace("|", "/"), coverage))
+    else:
+        lines.append("**Missing keywords** (most important first, match %.1f%%):" % result["match"])
+        lines.append("")
+        lines.extend("- %s" % term for term, _ in result["missing"])
+        if not result["missing"]:
+            lines.append("- None found")
+    return "\n".join(lines)
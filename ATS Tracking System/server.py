@@ -0,0 +1,456 @@
+"""
+Headless HTTP API for the analysis pipeline, built on asyncio streams.
+
+    python server.py --port 8080 --workers 4
+
+Endpoints:
+    GET  /healthz             liveness and current load of the answering worker
+    GET  /analyses            the analysis types (keys of the prompts table)
+    POST /analyze             multipart form: resume (PDF file), job_description,
+                              analysis (repeatable), ingest ("text", "image" or "profile";
+                              formatting analyses always use "image"), format ("text" or "json").
+                              Returns {"results": {analysis: text}, "errors": {...}};
+                              with format=json, analyses that have a schema in
+                              structured.py return validated JSON objects instead of text.
+    POST /analyze?stream=1    same form; newline-delimited JSON chunks
+                              {"analysis": ..., "text": ...} as they are generated.
+
+Every worker process accepts on the same listening socket. Each worker admits
+at most ATS_API_MAX_INFLIGHT requests at once and queues up to ATS_API_MAX_QUEUE
+more; beyond that it answers 503 with Retry-After so a load balancer can back off.
+A request may ask for at most ATS_API_MAX_ANALYSES analyses. Requests taking longer
+than ATS_API_TIMEOUT seconds are answered with 504; model calls cannot be interrupted,
+so such a request keeps its admission until its calls finish.
+"""
+import io
+import os
+import json
+import socket
+import asyncio
+import argparse
+import threading
+import multiprocessing
+import urllib.parse
+import urllib.request
+import email.policy
+from email.parser import BytesParser
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_UPLOAD_BYTES = int(os.getenv("ATS_API_MAX_UPLOAD", str(10 * 1024 * 1024)))
+MAX_HEADER_BYTES = 64 * 1024
+READ_TIMEOUT = float(os.getenv("ATS_API_READ_TIMEOUT", "30"))
+REQUEST_TIMEOUT = float(os.getenv("ATS_API_TIMEOUT", "120"))
+MAX_ANALYSES = int(os.getenv("ATS_API_MAX_ANALYSES", "4"))
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    408: "Request Timeout", 413: "Payload Too Large", 500: "Internal Server Error",
+    503: "Service Unavailable", 504: "Gateway Timeout",
+}
+
+
+class HttpError(Exception):
+    """
+    An error answered with the given HTTP status and message.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Admission:
+    """
+    Backpressure for one worker: at most `inflight` requests run, `queue` more may wait.
+    """
+
+    def __init__(self, inflight, queue):
+        self.capacity = inflight + queue
+        self.admitted = 0
+        self.slots = asyncio.Semaphore(inflight)
+
+    def try_enter(self):
+        if self.admitted >= self.capacity:
+            return False
+        self.admitted += 1
+        return True
+
+    def leave(self):
+        self.admitted -= 1
+
+
+def parse_form(content_type, body):
+    """
+    Parse a multipart/form-data body into ({field: [values]}, {field: (filename, bytes)}).
+    """
+    if not content_type.startswith("multipart/form-data"):
+        raise HttpError(400, "Expected multipart/form-data")
+    message = BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    if not message.is_multipart():
+        raise HttpError(400, "Malformed multipart body")
+    fields, files = {}, {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if not name:
+            continue
+        data = part.get_payload(decode=True) or b""
+        filename = part.get_filename()
+        if filename is not None:
+            files[name] = (filename, data)
+        else:
+            fields.setdefault(name, []).append(data.decode("utf-8", errors="replace"))
+    return fields, files
+
+
+class AnalysisServer:
+    """
+    One worker's HTTP server. Rendering and model calls run on a thread pool
+    so the event loop only handles I/O.
+    """
+
+    def __init__(self, inflight=None, queue=None, timeout=REQUEST_TIMEOUT):
+        inflight = inflight or int(os.getenv("ATS_API_MAX_INFLIGHT", "16"))
+        queue = int(os.getenv("ATS_API_MAX_QUEUE", "32")) if queue is None else queue
+        self.timeout = timeout
+        self.admission = Admission(inflight, queue)
+        # Each admitted request may run one model call per analysis
+        self.executor = ThreadPoolExecutor(max_workers=inflight * MAX_ANALYSES, thread_name_prefix="api")
+
+    async def handle(self, reader, writer):
+        try:
+            try:
+                method, target, headers = await asyncio.wait_for(self.read_head(reader), READ_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise HttpError(408, "Timed out reading the request")
+            path, _, query = target.partition("?")
+            if path == "/healthz" and method == "GET":
+                await self.send_json(writer, 200, {"status": "ok", "admitted": self.admission.admitted})
+            elif path == "/analyses" and method == "GET":
+                from prompts import PROMPTS
+
+                await self.send_json(writer, 200, {"analyses": list(PROMPTS)})
+            elif path == "/analyze":
+                if method != "POST":
+                    raise HttpError(405, "Use POST")
+                await self.analyze(reader, writer, headers, urllib.parse.parse_qs(query))
+            else:
+                raise HttpError(404, "Unknown endpoint %s" % path)
+        except HttpError as e:
+            await self.send_json(writer, e.status, {"error": str(e)},
+                                 {"Retry-After": "1"} if e.status == 503 else None)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        except Exception as e:
+            await self.send_json(writer, 500, {"error": "%s: %s" % (type(e).__name__, e)})
+        finally:
+            writer.close()
+
+    async def read_head(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        if len(head) > MAX_HEADER_BYTES:
+            raise HttpError(400, "Headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def analyze(self, reader, writer, headers, query):
+        if not self.admission.try_enter():
+            raise HttpError(503, "Server busy")
+        # Executor work started for this request; admission is given back once it is all done
+        work = []
+        acquired = False
+        try:
+            length = int(headers.get("content-length", "0"))
+            if length > MAX_UPLOAD_BYTES:
+                raise HttpError(413, "Upload larger than %d bytes" % MAX_UPLOAD_BYTES)
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise HttpError(408, "Timed out reading the upload")
+            request = self.parse_request(headers.get("content-type", ""), body)
+            del body
+
+            await self.admission.slots.acquire()
+            acquired = True
+            if query.get("stream", ["0"])[0] == "1":
+                if request[-1] == "json":
+                    raise HttpError(400, "format=json cannot be streamed")
+                await self.stream_analyses(writer, work, *request[:-1])
+                return
+            work.append(asyncio.ensure_future(self.run_analyses(*request)))
+            try:
+                # Shielded: on timeout the analyses keep running and keep holding the slot
+                response = await asyncio.wait_for(asyncio.shield(work[0]), self.timeout)
+            except asyncio.TimeoutError:
+                raise HttpError(504, "Analysis exceeded %.0fs" % self.timeout)
+            await self.send_json(writer, 200, response)
+        finally:
+            self.release(work, acquired)
+
+    def release(self, work, acquired):
+        """
+        Give back the request's slot and admission once all of its executor work is done,
+        so requests that timed out still count against the limits while their calls run.
+        """
+        def leave(_=None):
+            if acquired:
+                self.admission.slots.release()
+            self.admission.leave()
+
+        pending = [future for future in work if not future.done()]
+        if pending:
+            asyncio.gather(*pending, return_exceptions=True).add_done_callback(leave)
+        else:
+            leave()
+
+    def parse_request(self, content_type, body):
+        from prompts import PROMPTS
+
+        fields, files = parse_form(content_type, body)
+        if "resume" not in files:
+            raise HttpError(400, "Missing 'resume' file")
+        analyses = fields.get("analysis") or ["Resume Evaluation"]
+        if len(analyses) > MAX_ANALYSES:
+            raise HttpError(400, "At most %d analyses per request" % MAX_ANALYSES)
+        unknown = [analysis for analysis in analyses if analysis not in PROMPTS]
+        if unknown:
+            raise HttpError(400, "Unknown analysis type(s): %s" % ", ".join(unknown))
+        ingest = (fields.get("ingest") or ["text"])[0]
+        if ingest not in ("text", "image", "profile"):
+            raise HttpError(400, "ingest must be 'text', 'image' or 'profile'")
+        output_format = (fields.get("format") or ["text"])[0]
+        if output_format not in ("text", "json"):
+            raise HttpError(400, "format must be 'text' or 'json'")
+        job_description = (fields.get("job_description") or [""])[0]
+        return job_description, files["resume"][1], analyses, ingest, output_format
+
+    async def prepare(self, pdf_bytes, ingest):
+        from app import prepare_resume
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, prepare_resume, io.BytesIO(pdf_bytes), ingest)
+        except Exception as e:
+            raise HttpError(400, "Could not read the resume: %s" % e)
+
+    async def prepare_all(self, pdf_bytes, analyses, ingest):
+        """
+        Prepare the resume once for every ingestion mode the analyses need. Returns {analysis: parts}.
+        """
+        from app import ingest_groups
+
+        groups = ingest_groups(analyses, ingest)
+        # Let every preparation finish before failing, so no executor work outlives the request's admission
+        prepared = await asyncio.gather(*(self.prepare(pdf_bytes, mode) for mode in groups), return_exceptions=True)
+        for outcome in prepared:
+            if isinstance(outcome, Exception):
+                raise outcome
+        return {analysis: parts for parts, options in zip(prepared, groups.values()) for analysis in options}
+
+    async def run_analyses(self, job_description, pdf_bytes, analyses, ingest, output_format):
+        from app import get_gemini_response, structured_gemini_response
+        from prompts import PROMPTS
+        from structured import SCHEMAS
+
+        parts = await self.prepare_all(pdf_bytes, analyses, ingest)
+        loop = asyncio.get_running_loop()
+
+        def call(analysis):
+            if output_format == "json" and analysis in SCHEMAS:
+                return loop.run_in_executor(
+                    self.executor, structured_gemini_response, job_description, parts[analysis], analysis)
+            return loop.run_in_executor(
+                self.executor, get_gemini_response, job_description, parts[analysis], PROMPTS[analysis])
+
+        outcomes = await asyncio.gather(*(call(analysis) for analysis in analyses), return_exceptions=True)
+        response = {"results": {}, "errors": {}}
+        for analysis, outcome in zip(analyses, outcomes):
+            if isinstance(outcome, Exception):
+                response["errors"][analysis] = str(outcome)
+            else:
+                response["results"][analysis] = outcome
+        return response
+
+    async def stream_analyses(self, writer, work, job_description, pdf_bytes, analyses, ingest):
+        """
+        Stream every analysis as NDJSON lines, interleaved as chunks arrive.
+        Executor work is appended to `work` so the caller can wait for it to finish.
+        """
+        from app import stream_gemini_response
+        from prompts import PROMPTS
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        work.append(asyncio.ensure_future(self.prepare_all(pdf_bytes, analyses, ingest)))
+        try:
+            parts = await asyncio.wait_for(asyncio.shield(work[-1]), self.timeout)
+        except asyncio.TimeoutError:
+            raise HttpError(504, "Reading the resume exceeded %.0fs" % self.timeout)
+        lines = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce(analysis):
+            try:
+                for chunk in stream_gemini_response(job_description, parts[analysis], PROMPTS[analysis]):
+                    if cancelled.is_set():
+                        return
+                    loop.call_soon_threadsafe(lines.put_nowait, {"analysis": analysis, "text": chunk})
+            except Exception as e:
+                loop.call_soon_threadsafe(lines.put_nowait, {"analysis": analysis, "error": str(e)})
+            finally:
+                loop.call_soon_threadsafe(lines.put_nowait, None)
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+        for analysis in analyses:
+            work.append(loop.run_in_executor(self.executor, produce, analysis))
+        remaining = len(analyses)
+        try:
+            while remaining:
+                try:
+                    line = await asyncio.wait_for(lines.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    line = {"error": "Analysis exceeded %.0fs" % self.timeout}
+                    remaining = 0
+                if line is None:
+                    remaining -= 1
+                    continue
+                writer.write((json.dumps(line) + "\n").encode())
+                # Slow clients hold back the producers instead of buffering without bound
+                await writer.drain()
+        finally:
+            cancelled.set()
+
+    async def send_json(self, writer, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode()
+        head = ["HTTP/1.1 %d %s" % (status, STATUS_TEXT.get(status, "")),
+                "Content-Type: application/json",
+                "Content-Length: %d" % len(body),
+                "Connection: close"]
+        for name, value in (extra_headers or {}).items():
+            head.append("%s: %s" % (name, value))
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+
+
+async def serve(sock):
+    """
+    Run one worker's event loop on an already bound listening socket.
+    """
+    from client import get_client
+    from tracing import start_metrics_server
+
+    get_client()
+    start_metrics_server()
+    app = AnalysisServer()
+    server = await asyncio.start_server(app.handle, sock=sock, limit=MAX_HEADER_BYTES)
+    async with server:
+        await server.serve_forever()
+
+
+def run_worker(sock):
+    asyncio.run(serve(sock))
+
+
+def listen(host, port):
+    """
+    Bind the listening socket shared by all worker processes.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+def _analyze_request(url, fields, pdf_bytes):
+    # Multipart POST /analyze request carrying the form fields and the resume
+    boundary = "ats-%s" % os.urandom(12).hex()
+    parts = []
+    for name, value in fields:
+        parts.append(('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n'
+                      % (boundary, name, value)).encode("utf-8"))
+    parts.append(('--%s\r\nContent-Disposition: form-data; name="resume"; filename="resume.pdf"\r\n'
+                  'Content-Type: application/pdf\r\n\r\n' % boundary).encode())
+    parts.append(bytes(pdf_bytes))
+    parts.append(("\r\n--%s--\r\n" % boundary).encode())
+    return urllib.request.Request(
+        url, data=b"".join(parts), headers={"Content-Type": "multipart/form-data; boundary=%s" % boundary}
+    )
+
+
+def analyze_remote(url, job_description, pdf_bytes, analysis, ingest="text", timeout=REQUEST_TIMEOUT):
+    """
+    Client for POST /analyze?stream=1: yield the text chunks of one analysis from the service at `url`.
+    """
+    request = _analyze_request(
+        url.rstrip("/") + "/analyze?stream=1",
+        [("job_description", job_description), ("analysis", analysis), ("ingest", ingest)],
+        pdf_bytes,
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        for line in response:
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            if "error" in message:
+                raise RuntimeError(message["error"])
+            yield message["text"]
+
+
+def analyze_remote_structured(url, job_description, pdf_bytes, analysis, ingest="text", timeout=REQUEST_TIMEOUT):
+    """
+    Client for POST /analyze with format=json: return the validated JSON result of one analysis.
+    """
+    request = _analyze_request(
+        url.rstrip("/") + "/analyze",
+        [("job_description", job_description), ("analysis", analysis), ("ingest", ingest), ("format", "json")],
+        pdf_bytes,
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        message = json.load(response)
+    if analysis in message["errors"]:
+        raise RuntimeError(message["errors"][analysis])
+    return message["results"][analysis]
+
+
+def main():
+    """
+    Parse arguments and start the worker processes.
+    """
+    parser = argparse.ArgumentParser(description="Serve the resume analysis pipeline over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("ATS_API_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("ATS_API_WORKERS", os.cpu_count() or 1)),
+                        help="Worker processes accepting on the shared socket.")
+    args = parser.parse_args()
+
+    sock = listen(args.host, args.port)
+    print("Serving on http://%s:%d with %d worker(s)" % (args.host, args.port, args.workers))
+    if args.workers <= 1:
+        run_worker(sock)
+        return
+    # Forked workers inherit the bound socket; the kernel spreads connections across them
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=run_worker, args=(sock,), daemon=True) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Import-time report for the app's startup budget.
+
+Each module is imported in a fresh interpreter so the numbers reflect a cold
+start. Exits non-zero if importing the app exceeds ATS_STARTUP_BUDGET_MS.
+
+    python startup_report.py [module ...]
+"""
+import os
+import sys
+import subprocess
+
+DEFAULT_MODULES = [
+    "app",
+    "prompts",
+    "streamlit",
+    "google.generativeai",
+    "pdf2image",
+    "PIL.Image",
+    "numpy",
+]
+
+MEASURE = "import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)"
+
+
+def import_time(module):
+    """
+    Seconds taken to import `module` in a new interpreter, or None if it fails to import.
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE % module],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    """
+    Print the import time of each module and check the app against the budget.
+    """
+    modules = sys.argv[1:] or DEFAULT_MODULES
+    budget_ms = float(os.getenv("ATS_STARTUP_BUDGET_MS", "500"))
+    over_budget = False
+    print("%-24s %10s" % ("module", "import ms"))
+    for module in modules:
+        seconds = import_time(module)
+        if seconds is None:
+            print("%-24s %10s" % (module, "failed"))
+            continue
+        flag = ""
+        if module == "app" and seconds * 1000 > budget_ms:
+            flag = "  over budget (%.0f ms)" % budget_ms
+            over_budget = True
+        print("%-24s %10.1f%s" % (module, seconds * 1000, flag))
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
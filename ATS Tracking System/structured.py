@@ -0,0 +1,206 @@
+"""
+Structured output mode: analyses answered as schema-validated JSON with a
+bounded output token budget, so results can be stored, aggregated and
+compared across candidates without re-querying the model.
+
+Each structured analysis has a JSON schema (a small subset of JSON Schema:
+type, properties, required, items, enum, minimum/maximum, maxItems, maxLength).
+The schema is included in the prompt, the model is asked for JSON only, and
+the reply is validated before it is returned or cached.
+"""
+import os
+import json
+
+# Characters per output token assumed when sizing the budget (JSON of short English strings)
+CHARS_PER_TOKEN = 3
+# Extra tokens on top of the schema's worst case, for whitespace the model may add
+BUDGET_MARGIN = 64
+
+_KEYWORDS = {"type": "array", "maxItems": 15, "items": {"type": "string", "maxLength": 40}}
+_REQUIREMENTS = {
+    "type": "array",
+    "maxItems": 10,
+    "items": {
+        "type": "object",
+        "required": ["requirement", "rating"],
+        "properties": {
+            "requirement": {"type": "string", "maxLength": 80},
+            "rating": {"type": "integer", "minimum": 0, "maximum": 5},
+            "evidence": {"type": "string", "maxLength": 120},
+        },
+    },
+}
+_SCORE = {"type": "number", "minimum": 0, "maximum": 100}
+_SUMMARY = {"type": "string", "maxLength": 300}
+
+SCHEMAS = {
+    "Percentage Match": {
+        "type": "object",
+        "required": ["score", "matched_keywords", "missing_keywords", "requirements"],
+        "properties": {
+            "score": _SCORE,
+            "matched_keywords": _KEYWORDS,
+            "missing_keywords": _KEYWORDS,
+            "requirements": _REQUIREMENTS,
+            "summary": _SUMMARY,
+        },
+    },
+    "Keywords Missing": {
+        "type": "object",
+        "required": ["score", "matched_keywords", "missing_keywords"],
+        "properties": {
+            "score": _SCORE,
+            "matched_keywords": _KEYWORDS,
+            "missing_keywords": {
+                "type": "array",
+                "maxItems": 15,
+                "items": {
+                    "type": "object",
+                    "required": ["keyword", "importance"],
+                    "properties": {
+                        "keyword": {"type": "string", "maxLength": 40},
+                        "importance": {"type": "string", "enum": ["high", "medium", "low"]},
+                        "suggestion": {"type": "string", "maxLength": 120},
+                    },
+                },
+            },
+        },
+    },
+    "Technical Skill Gap Analysis": {
+        "type": "object",
+        "required": ["score", "requirements", "skill_gaps"],
+        "properties": {
+            "score": _SCORE,
+            "requirements": _REQUIREMENTS,
+            "skill_gaps": {
+                "type": "array",
+                "maxItems": 8,
+                "items": {
+                    "type": "object",
+                    "required": ["skill", "severity"],
+                    "properties": {
+                        "skill": {"type": "string", "maxLength": 40},
+                        "severity": {"type": "string", "enum": ["critical", "moderate", "minor"]},
+                        "recommendation": {"type": "string", "maxLength": 150},
+                    },
+                },
+            },
+            "summary": _SUMMARY,
+        },
+    },
+}
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+}
+
+
+class StructuredOutputError(ValueError):
+    """
+    The model's reply was not valid JSON or did not match the analysis schema.
+    """
+
+
+def max_chars(schema):
+    """
+    Upper bound on the length of compact JSON that matches `schema`.
+    """
+    expected = schema.get("type")
+    if "enum" in schema:
+        return max(len(json.dumps(value)) for value in schema["enum"])
+    if expected == "string":
+        # Escapes can lengthen a string; two quotes around it
+        return schema.get("maxLength", 200) + 2
+    if expected == "array":
+        return 2 + schema.get("maxItems", 20) * (max_chars(schema.get("items", {})) + 1)
+    if expected == "object":
+        return 2 + sum(len(name) + 4 + max_chars(subschema)
+                       for name, subschema in schema.get("properties", {}).items())
+    return 12  # numbers and booleans
+
+
+def max_output_tokens(analysis):
+    """
+    Return the output token budget for a structured analysis: the largest answer its schema
+    allows, or ATS_STRUCTURED_MAX_TOKENS if set.
+    """
+    override = os.getenv("ATS_STRUCTURED_MAX_TOKENS")
+    if override:
+        return int(override)
+    return -(-max_chars(SCHEMAS[analysis]) // CHARS_PER_TOKEN) + BUDGET_MARGIN
+
+
+def generation_config(analysis):
+    """
+    Generation config for structured calls: JSON output and a bounded token budget.
+    """
+    return {"response_mime_type": "application/json", "max_output_tokens": max_output_tokens(analysis)}
+
+
+def structured_prompt(analysis, prompt):
+    """
+    Turn an analysis prompt into a request for JSON matching the analysis schema.
+    """
+    return (
+        "%s\n\nRespond with a single JSON object only, no Markdown or prose, matching this JSON schema "
+        "(respect maxItems and maxLength; ratings are 0 = not met to 5 = fully met; keep the whole "
+        "answer under %d tokens):\n%s"
+        % (prompt, max_output_tokens(analysis), json.dumps(SCHEMAS[analysis], separators=(",", ":")))
+    )
+
+
+def validate(value, schema, path="$"):
+    """
+    Return a list of "path: problem" strings; empty when `value` matches `schema`.
+    """
+    expected = schema.get("type")
+    if expected:
+        # bool is an int subclass but never a valid number here
+        if not isinstance(value, _TYPES[expected]) or (isinstance(value, bool) and expected != "boolean"):
+            return ["%s: expected %s" % (path, expected)]
+    errors = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append("%s: %r is not one of %s" % (path, value, schema["enum"]))
+    if "minimum" in schema and value < schema["minimum"]:
+        errors.append("%s: below %s" % (path, schema["minimum"]))
+    if "maximum" in schema and value > schema["maximum"]:
+        errors.append("%s: above %s" % (path, schema["maximum"]))
+    if "maxLength" in schema and len(value) > schema["maxLength"]:
+        errors.append("%s: longer than %d characters" % (path, schema["maxLength"]))
+    if expected == "array":
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append("%s: more than %d items" % (path, schema["maxItems"]))
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema.get("items", {}), "%s[%d]" % (path, i)))
+    if expected == "object":
+        for name in schema.get("required", []):
+            if name not in value:
+                errors.append("%s: missing %r" % (path, name))
+        for name, subschema in schema.get("properties", {}).items():
+            if name in value:
+                errors.extend(validate(value[name], subschema, "%s.%s" % (path, name)))
+    return errors
+
+
+def parse_response(analysis, text):
+    """
+    Parse and validate a structured reply for `analysis`. Raises StructuredOutputError.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        # Tolerate a fenced block even though the prompt asks for bare JSON
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0]
+    try:
+        value = json.loads(text)
+    except ValueError as e:
+        raise StructuredOutputError("%s: reply is not valid JSON (%s); the output token budget may be too small"
+                                    % (analysis, e))
+    errors = validate(value, SCHEMAS[analysis])
+    if errors:
+        raise StructuredOutputError("%s: reply does not match the schema: %s" % (analysis, "; ".join(errors[:5])))
+    return value
@@ -0,0 +1,238 @@
+"""
+Lightweight per-stage tracing: durations, payload sizes and token counts,
+tagged by analysis type.
+
+Each finished span is logged as one JSON line on the "ats.trace" logger and
+folded into in-process Prometheus-style metrics. The metrics are exposed as
+text on ATS_METRICS_PORT (/metrics) and/or written to ATS_METRICS_FILE after
+every top-level span. Set ATS_TRACE_LOG=0 to silence the JSON log.
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger("ats.trace")
+if os.getenv("ATS_TRACE_LOG", "1") != "0" and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_current = contextvars.ContextVar("ats_span", default=None)
+
+
+class Span:
+    """
+    One timed stage. Tags are inherited from the enclosing span; fields hold measurements.
+    """
+
+    def __init__(self, name, tags, parent):
+        self.name = name
+        self.tags = tags
+        self.parent = parent
+        self.fields = {}
+        self.duration = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add(self, **fields):
+        for name, value in fields.items():
+            self.fields[name] = self.fields.get(name, 0) + value
+
+
+class Metrics:
+    """
+    Histograms of stage durations and counters of bytes and tokens, keyed by label values.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations = {}
+        self.counters = {}
+
+    def observe(self, span):
+        labels = (("stage", span.name), ("analysis", span.tags.get("analysis", "")))
+        with self._lock:
+            histogram = self.durations.setdefault(labels, [0] * len(BUCKETS) + [0, 0.0])
+            for i, bound in enumerate(BUCKETS):
+                if span.duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration
+            for field, metric in (("bytes", "ats_payload_bytes_total"),
+                                  ("input_tokens", "ats_input_tokens_total"),
+                                  ("output_tokens", "ats_output_tokens_total"),
+                                  ("cached_tokens", "ats_cached_tokens_total")):
+                if span.fields.get(field):
+                    key = (metric, labels)
+                    self.counters[key] = self.counters.get(key, 0) + span.fields[field]
+            if "error" in span.fields:
+                key = ("ats_stage_errors_total", labels)
+                self.counters[key] = self.counters.get(key, 0) + 1
+
+    def count(self, metric, value=1):
+        """
+        Add `value` to an unlabelled counter.
+        """
+        with self._lock:
+            key = (metric, ())
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def prometheus_text(self):
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{%s}" % ",".join('%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in pairs)
+
+        lines = ["# TYPE ats_stage_seconds histogram"]
+        with self._lock:
+            for labels, histogram in sorted(self.durations.items()):
+                for bound, count in zip(BUCKETS, histogram):
+                    lines.append("ats_stage_seconds_bucket%s %d" % (label_text(labels, [("le", bound)]), count))
+                lines.append("ats_stage_seconds_bucket%s %d" % (label_text(labels, [("le", "+Inf")]), histogram[-2]))
+                lines.append("ats_stage_seconds_count%s %d" % (label_text(labels), histogram[-2]))
+                lines.append("ats_stage_seconds_sum%s %.6f" % (label_text(labels), histogram[-1]))
+            metric_names = sorted({metric for metric, _ in self.counters})
+            for metric in metric_names:
+                lines.append("# TYPE %s counter" % metric)
+                for (name, labels), value in sorted(self.counters.items()):
+                    if name == metric:
+                        lines.append("%s%s %s" % (metric, label_text(labels), value))
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+def _finish(span):
+    # Tracing must never fail the stage it measures
+    try:
+        metrics.observe(span)
+        if logger.isEnabledFor(logging.INFO):
+            record = {"ts": round(time.time(), 3), "span": span.name, "ms": round(span.duration * 1000, 2)}
+            record.update(span.tags)
+            record.update(span.fields)
+            logger.info(json.dumps(record, default=str))
+        if span.parent is None:
+            _write_metrics_file()
+    except Exception:
+        logging.getLogger(__name__).warning("Could not export span %s", span.name, exc_info=True)
+
+
+@contextmanager
+def span(name, **tags):
+    """
+    Time a stage. Tags (e.g. analysis="Percentage Match") apply to this span and its children.
+    """
+    parent = _current.get()
+    merged = dict(parent.tags) if parent is not None else {}
+    merged.update(tags)
+    current = Span(name, merged, parent)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current.reset(token)
+        _finish(current)
+
+
+def current_span():
+    """
+    Return the innermost active span, or None.
+    """
+    return _current.get()
+
+
+def record_usage(usage_metadata):
+    """
+    Add token counts from a model response's usage metadata to the current span.
+    """
+    active = _current.get()
+    if active is None or usage_metadata is None:
+        return
+    active.add(
+        input_tokens=getattr(usage_metadata, "prompt_token_count", 0) or 0,
+        output_tokens=getattr(usage_metadata, "candidates_token_count", 0) or 0,
+        cached_tokens=getattr(usage_metadata, "cached_content_token_count", 0) or 0,
+    )
+
+
+_last_file_write = 0.0
+_file_lock = threading.Lock()
+
+
+def _write_metrics_file():
+    global _last_file_write
+    path = os.getenv("ATS_METRICS_FILE")
+    if not path:
+        return
+    with _file_lock:
+        now = time.monotonic()
+        # At most one write per second keeps the file export cheap under load
+        if now - _last_file_write < 1.0:
+            return
+        _last_file_write = now
+        # Unique temp file: other processes may export to the same path
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(metrics.prometheus_text())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=None):
+    """
+    Serve /metrics on ATS_METRICS_PORT (once per process). Returns the server or None.
+    """
+    global _metrics_server
+    port = port or os.getenv("ATS_METRICS_PORT")
+    if _metrics_server is None and port:
+        try:
+            _metrics_server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+        except OSError:
+            # Another process on this host already serves the port
+            return None
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    return _metrics_server